@@ -27,9 +27,14 @@ ROLE_ARN="arn:aws:iam::${ACCOUNT_ID}:role/${PROJECT_NAME}-lambda-role-${ENVIRONM
 COMMENTS_TABLE="${PROJECT_NAME}-comments-${ENVIRONMENT}"
 CONFIG_TABLE="${PROJECT_NAME}-config-${ENVIRONMENT}"
 AUDIT_TABLE="${PROJECT_NAME}-audit-${ENVIRONMENT}"
+CLASSIFICATION_CACHE_TABLE="${PROJECT_NAME}-classification-cache-${ENVIRONMENT}"
 QUEUE_URL="https://sqs.${REGION}.amazonaws.com/${ACCOUNT_ID}/${PROJECT_NAME}-comments-${ENVIRONMENT}"
 SECRET_NAME="${PROJECT_NAME}-api-keys-${ENVIRONMENT}"
 
+# Optional: ARN of the AWS Parameters and Secrets Lambda Extension layer for ${REGION}.
+# When set, functions read secrets from the extension's local cache instead of Secrets Manager
+SECRETS_EXTENSION_LAYER_ARN="${SECRETS_EXTENSION_LAYER_ARN:-}"
+
 echo "Using Account ID: ${ACCOUNT_ID}"
 echo "Using Role ARN: ${ROLE_ARN}"
 
@@ -153,13 +158,23 @@ deploy_function() {
     # Set environment variables with proper JSON formatting
     echo "Setting environment variables..."
     
+    # Secrets extension layer and its port, if configured
+    local extension_args=""
+    local extension_env=""
+    if [ -n "${SECRETS_EXTENSION_LAYER_ARN}" ]; then
+        extension_args="--layers ${SECRETS_EXTENSION_LAYER_ARN}"
+        extension_env='"PARAMETERS_SECRETS_EXTENSION_HTTP_PORT": "2773",'
+    fi
+    
     # Create environment variables JSON file
     cat > /tmp/env-vars.json << EOF
 {
     "Variables": {
+        ${extension_env}
         "COMMENTS_TABLE": "${COMMENTS_TABLE}",
         "CONFIG_TABLE": "${CONFIG_TABLE}",
         "AUDIT_TABLE": "${AUDIT_TABLE}",
+        "CLASSIFICATION_CACHE_TABLE": "${CLASSIFICATION_CACHE_TABLE}",
         "QUEUE_URL": "${QUEUE_URL}",
         "SECRET_NAME": "${SECRET_NAME}"
     }
@@ -169,6 +184,7 @@ EOF
     aws lambda update-function-configuration \
         --function-name ${aws_function_name} \
         --environment file:///tmp/env-vars.json \
+        ${extension_args} \
         --region ${REGION} > /dev/null
     
     # Wait for environment update to complete
@@ -264,6 +280,7 @@ main() {
             --function-name "${PROJECT_NAME}-reply-handler-${ENVIRONMENT}" \
             --event-source-arn ${queue_arn} \
             --batch-size 10 \
+            --function-response-types ReportBatchItemFailures \
             --region ${REGION} > /dev/null
         echo "✅ Reply handler SQS trigger created"
     else
@@ -304,6 +321,7 @@ main() {
             --function-name "${PROJECT_NAME}-escalation-handler-${ENVIRONMENT}" \
             --event-source-arn ${queue_arn} \
             --batch-size 10 \
+            --function-response-types ReportBatchItemFailures \
             --region ${REGION} > /dev/null
         echo "✅ Escalation handler SQS trigger created"
     else
@@ -67,6 +67,12 @@ resource "aws_dynamodb_table" "comments" {
     projection_type = "ALL"
   }
 
+  # Only test items set expires_at; real comments never expire
+  ttl {
+    attribute_name = "expires_at"
+    enabled        = true
+  }
+
   tags = {
     Name        = "${var.project_name}-comments"
     Environment = var.environment
@@ -89,6 +95,14 @@ resource "aws_dynamodb_table" "config" {
     type = "S"
   }
 
+  global_secondary_index {
+    name     = "ConfigTypeIndex"
+    hash_key = "config_type"
+    range_key = "client_id"
+    projection_type = "INCLUDE"
+    non_key_attributes = ["config"]
+  }
+
   tags = {
     Name        = "${var.project_name}-config"
     Environment = var.environment
@@ -128,6 +142,28 @@ resource "aws_dynamodb_table" "audit_logs" {
   }
 }
 
+# Shared cache of OpenAI classifications keyed by client and normalized comment text
+resource "aws_dynamodb_table" "classification_cache" {
+  name         = "${var.project_name}-classification-cache-${var.environment}"
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "cache_key"
+
+  attribute {
+    name = "cache_key"
+    type = "S"
+  }
+
+  ttl {
+    attribute_name = "expires_at"
+    enabled        = true
+  }
+
+  tags = {
+    Name        = "${var.project_name}-classification-cache"
+    Environment = var.environment
+  }
+}
+
 # SQS Queue for comment processing
 resource "aws_sqs_queue" "comment_processing" {
   name                       = "${var.project_name}-comments-${var.environment}"
@@ -258,16 +294,20 @@ resource "aws_iam_role_policy" "lambda_policy" {
         Effect = "Allow"
         Action = [
           "dynamodb:PutItem",
+          "dynamodb:BatchWriteItem",
           "dynamodb:GetItem",
+          "dynamodb:BatchGetItem",
           "dynamodb:UpdateItem",
           "dynamodb:DeleteItem",
           "dynamodb:Query",
-          "dynamodb:Scan"
+          "dynamodb:Scan",
+          "dynamodb:DescribeTable"
         ]
         Resource = [
           aws_dynamodb_table.comments.arn,
           aws_dynamodb_table.config.arn,
           aws_dynamodb_table.audit_logs.arn,
+          aws_dynamodb_table.classification_cache.arn,
           "${aws_dynamodb_table.comments.arn}/*",
           "${aws_dynamodb_table.config.arn}/*",
           "${aws_dynamodb_table.audit_logs.arn}/*"
@@ -616,9 +656,10 @@ resource "aws_cloudwatch_metric_alarm" "lambda_errors" {
 output "dynamodb_tables" {
   description = "DynamoDB table names"
   value = {
-    comments   = aws_dynamodb_table.comments.name
-    config     = aws_dynamodb_table.config.name
-    audit_logs = aws_dynamodb_table.audit_logs.name
+    comments             = aws_dynamodb_table.comments.name
+    config               = aws_dynamodb_table.config.name
+    audit_logs           = aws_dynamodb_table.audit_logs.name
+    classification_cache = aws_dynamodb_table.classification_cache.name
   }
 }
 
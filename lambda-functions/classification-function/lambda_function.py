@@ -12,9 +12,74 @@ import os
 #sys.path.append('/opt/python')
 #sys.path.append(os.path.join(os.path.dirname(__file__), 'shared'))
 
-from shared.utils import AWSService, OpenAIClient, lambda_response, validate_required_env_vars, logger
+from shared.utils import AWSService, OpenAIClient, TTLCache, compile_keyword_pattern, json_loads, lambda_response, validate_required_env_vars, logger
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timezone
-import uuid
+from enum import IntEnum
+from typing import Optional
+from zoneinfo import ZoneInfo
+import hashlib
+import re
+
+
+class Urgency(IntEnum):
+    """Ordered urgency levels; stored as lowercase labels in DynamoDB and SQS"""
+    LOW = 0
+    MEDIUM = 1
+    HIGH = 2
+    
+    @classmethod
+    def from_label(cls, label: str) -> 'Urgency':
+        return cls.__members__.get(str(label).upper(), cls.LOW)
+    
+    @property
+    def label(self) -> str:
+        return self.name.lower()
+
+
+# Services are created once per container and reused across warm invocations
+_AWS_SERVICE = None
+_OPENAI_CLIENT = None
+
+# Upper bound on concurrent classifications (matches the SQS batch size and
+# stays below BOTO_CONFIG's max_pool_connections)
+MAX_WORKERS = 10
+
+# Comments classified per OpenAI request
+OPENAI_BATCH_SIZE = 10
+
+# Exact-match cache of OpenAI classifications, namespaced by client and keyed by
+# normalized comment text, so duplicate comments skip the OpenAI call
+_CLASSIFICATION_CACHE = TTLCache(maxsize=4096, ttl_seconds=3 * 60 * 60)
+
+# Shapes of comment that are classified without OpenAI: link-shortener and
+# messenger spam, and comments with no letters or digits (emoji, punctuation, empty)
+SPAM_LINK_PATTERN = re.compile(r'\b(?:bit\.ly|tinyurl\.com|t\.me|wa\.me)/', re.IGNORECASE)
+WORD_PATTERN = re.compile(r'\w')
+
+# Compiled keyword rules per client, kept alongside the cached client config
+_CLIENT_RULES_CACHE = TTLCache(maxsize=256, ttl_seconds=300)
+
+
+def _get_services():
+    """Return the cached AWSService / OpenAIClient, initializing them on first use"""
+    global _AWS_SERVICE, _OPENAI_CLIENT
+    
+    if _OPENAI_CLIENT is None:
+        aws_service = AWSService()
+        secrets = aws_service.get_secrets()
+        _OPENAI_CLIENT = OpenAIClient(secrets['openai_api_key'])
+        _AWS_SERVICE = aws_service
+    
+    return _AWS_SERVICE, _OPENAI_CLIENT
+
+
+# Initialize during the Lambda init phase; a failure here (e.g. a Secrets Manager
+# blip) is retried on the first invocation instead of poisoning the container
+try:
+    _get_services()
+except Exception as e:
+    logger.warning(f"Deferred service initialization to first invocation: {e}")
 
 
 def lambda_handler(event, context):
@@ -30,55 +95,86 @@ def lambda_handler(event, context):
     if not validate_required_env_vars(required_vars):
         return lambda_response(500, {'error': 'Missing required environment variables'})
     
+    aws_service = None
+    
+    # One timestamp for every record written by this invocation
+    now_iso = datetime.now(timezone.utc).isoformat()
+    
     try:
-        # Initialize services
-        aws_service = AWSService()
-        secrets = aws_service.get_secrets()
-        
-        # Initialize OpenAI client
-        openai_client = OpenAIClient(secrets['openai_api_key'])
+        # Reuse services initialized outside the handler
+        aws_service, openai_client = _get_services()
         
         processed_count = 0
         errors = []
+        messages = []
         
-        # Process each SQS record
+        # Parse every SQS record up front so the batch can be prefetched
         for record in event.get('Records', []):
             try:
-                # Parse SQS message
-                message_body = json.loads(record['body'])
+                message_body = json_loads(record['body'])
                 
                 # Only process classify_comment actions
                 if message_body.get('action') != 'classify_comment':
                     continue
-                    
-                comment_id = message_body['comment_id']
-                client_id = message_body['client_id'] 
-                       
-                logger.info(f"Processing comment: {comment_id}")
-                
-                # Classify the comment
-                success = classify_comment(
-                    aws_service, 
-                    openai_client, 
-                    comment_id, 
-                    client_id
-                )
                 
-                if success:
-                    processed_count += 1
-                else:
-                    errors.append(f"Failed to classify comment {comment_id}")
+                messages.append((message_body['comment_id'], message_body['client_id']))
                 
             except Exception as e:
                 error_msg = f"Error processing record: {str(e)}"
                 logger.error(error_msg)
                 errors.append(error_msg)
         
+        # Fetch all comments and client configs in two BatchGetItem round-trips
+        comments = aws_service.batch_get_comments([comment_id for comment_id, _ in messages])
+        client_configs = aws_service.batch_get_client_configs(
+            [client_id for _, client_id in messages],
+            'classification_rules'
+        )
+        
+        # One OpenAI request per client group instead of one per comment
+        classifications, locally_classified = classify_comment_batches(
+            aws_service, openai_client, messages, comments, client_configs
+        )
+        
+        # Action messages are collected and sent with SendMessageBatch afterwards
+        pending_messages = []
+        
+        # Apply rules and persist concurrently; each record is dominated by DynamoDB I/O
+        if messages:
+            with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(messages))) as executor:
+                futures = {}
+                for comment_id, client_id in messages:
+                    logger.info(f"Processing comment: {comment_id}")
+                    
+                    future = executor.submit(
+                        classify_comment,
+                        aws_service, 
+                        comment_id, 
+                        client_id,
+                        comments.get(comment_id),
+                        client_configs.get(client_id, {}),
+                        classifications.get(comment_id),
+                        now_iso,
+                        pending_messages
+                    )
+                    futures[future] = comment_id
+                
+                for future in as_completed(futures):
+                    if future.result():
+                        processed_count += 1
+                    else:
+                        errors.append(f"Failed to classify comment {futures[future]}")
+        
+        for index in aws_service.send_messages_batch(pending_messages):
+            message = pending_messages[index]['message']
+            errors.append(f"Failed to queue {message['action']} for comment {message['comment_id']}")
+        
         # Log audit information
-        aws_service.save_audit_log('classification_batch_completed', {
-            'timestamp': datetime.now(timezone.utc).isoformat(),
+        aws_service.record_audit('classification_batch_completed', {
+            'timestamp': now_iso,
             'records_received': len(event.get('Records', [])),
             'records_processed': processed_count,
+            'locally_classified': locally_classified,
             'errors': errors,
             'execution_duration_ms': context.get_remaining_time_in_millis()
         })
@@ -95,42 +191,181 @@ def lambda_handler(event, context):
         logger.error(f"Classification batch failed: {str(e)}")
         
         # Log error for monitoring
-        aws_service.save_audit_log('classification_batch_error', {
-            'error': str(e),
-            'timestamp': datetime.now(timezone.utc).isoformat()
-        })
+        if aws_service:
+            aws_service.record_audit('classification_batch_error', {
+                'error': str(e),
+                'timestamp': now_iso
+            })
         
         return lambda_response(500, {
             'status': 'error',
             'message': str(e)
         })
+    
+    finally:
+        # Write every audit entry from this invocation in one batch
+        if aws_service:
+            aws_service.flush_audit_logs()
 
 
-def classify_comment(aws_service: AWSService, openai_client: OpenAIClient, 
-                    comment_id: str, client_id: str) -> bool:
+def classify_comment_batches(aws_service: AWSService, openai_client: OpenAIClient, messages: list,
+                             comments: dict, client_configs: dict) -> tuple:
     """
-    Classify a single comment and determine the appropriate action
+    Classify comments with one OpenAI request per client, up to OPENAI_BATCH_SIZE comments each
+    Returns (classifications keyed by comment_id, number resolved by local rules)
     """
     
-    try:
-        # Get comment from database
-        comment = aws_service.get_comment(comment_id)
+    classifications = {}
+    locally_classified = 0
+    
+    # Resolve comments locally or from cache and group the rest by client so
+    # every request shares a single business context
+    client_comments = {}
+    for comment_id, client_id in messages:
+        comment = comments.get(comment_id)
         if not comment:
-            logger.error(f"Comment not found: {comment_id}")
-            return False
-        
-        # Get client-specific classification rules
-        client_config = aws_service.get_client_config(client_id, 'classification_rules')
-        business_context = client_config.get('business_context', '')
+            continue
         
-        # Classify using OpenAI
-        classification = openai_client.classify_comment(
-            comment['text'], 
-            business_context
+        # Client hide keywords force the action, so OpenAI adds nothing
+        local_classification = classify_locally(
+            comment['text'],
+            get_client_rules(client_id, client_configs.get(client_id, {}))
         )
+        if local_classification:
+            classifications[comment_id] = local_classification
+            locally_classified += 1
+            continue
+        
+        business_context = client_configs.get(client_id, {}).get('business_context', '')
+        cache_key = classification_cache_key(client_id, comment['text'], business_context)
+        cached = _CLASSIFICATION_CACHE.get(cache_key)
+        
+        if cached:
+            classifications[comment_id] = dict(cached)
+        else:
+            client_comments.setdefault(client_id, {}).setdefault(cache_key, []).append(comment_id)
+    
+    # Comments classified by any container in the last week come from the shared cache
+    persisted = aws_service.get_cached_classifications([
+        persisted_cache_key(cache_key)
+        for pending in client_comments.values() for cache_key in pending
+    ])
+    for client_id in list(client_comments):
+        pending = client_comments[client_id]
+        for cache_key in list(pending):
+            cached = persisted.get(persisted_cache_key(cache_key))
+            if cached:
+                _CLASSIFICATION_CACHE.set(cache_key, dict(cached))
+                for comment_id in pending.pop(cache_key):
+                    classifications[comment_id] = dict(cached)
+        if not pending:
+            del client_comments[client_id]
+    
+    # Identical comments within a client are only sent to OpenAI once
+    batches = []
+    for client_id, pending in client_comments.items():
+        cache_keys = list(pending)
+        for start in range(0, len(cache_keys), OPENAI_BATCH_SIZE):
+            batches.append((client_id, [pending[key] for key in cache_keys[start:start + OPENAI_BATCH_SIZE]],
+                            cache_keys[start:start + OPENAI_BATCH_SIZE]))
+    
+    if not batches:
+        return classifications, locally_classified
+    
+    new_cache_entries = {}
+    with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(batches))) as executor:
+        futures = {}
+        for client_id, comment_id_groups, cache_keys in batches:
+            future = executor.submit(
+                openai_client.classify_comments_batch,
+                [comments[comment_ids[0]]['text'] for comment_ids in comment_id_groups],
+                client_configs.get(client_id, {}).get('business_context', '')
+            )
+            futures[future] = (comment_id_groups, cache_keys)
+        
+        for future in as_completed(futures):
+            comment_id_groups, cache_keys = futures[future]
+            for comment_ids, cache_key, classification in zip(comment_id_groups, cache_keys, future.result()):
+                # Fallback classifications (confidence 0) are not cached
+                if classification.get('confidence'):
+                    _CLASSIFICATION_CACHE.set(cache_key, dict(classification))
+                    new_cache_entries[persisted_cache_key(cache_key)] = dict(classification)
+                for comment_id in comment_ids:
+                    classifications[comment_id] = dict(classification)
+    
+    aws_service.save_cached_classifications(new_cache_entries)
+    
+    return classifications, locally_classified
+
+
+def classify_locally(comment_text: str, rules: dict) -> Optional[dict]:
+    """
+    Classify a comment from client rules or its shape alone when they already determine the action
+    Returns None when the comment needs OpenAI classification
+    """
+    
+    if pattern_matches(rules['hide'], comment_text.lower()) or SPAM_LINK_PATTERN.search(comment_text):
+        # Maximum toxicity always clears the auto-hide threshold in determine_action
+        return {
+            'sentiment': 'negative',
+            'urgency': 'low',
+            'intent': 'spam',
+            'toxicity_score': 10,
+            'requires_response': False,
+            'suggested_action': 'hide',
+            'confidence': 100
+        }
+    
+    if not WORD_PATTERN.search(comment_text):
+        # Nothing to answer or moderate; confident enough not to be escalated
+        return {
+            'sentiment': 'neutral',
+            'urgency': 'low',
+            'intent': 'general',
+            'toxicity_score': 0,
+            'requires_response': False,
+            'suggested_action': 'ignore',
+            'confidence': 90
+        }
+    
+    return None
+
+
+def classification_cache_key(client_id: str, comment_text: str, business_context: str) -> tuple:
+    """Build the classification cache key from the client and normalized comment text"""
+    normalized_text = ' '.join(comment_text.lower().split())
+    return (
+        client_id,
+        hashlib.sha1(normalized_text.encode('utf-8')).hexdigest(),
+        hashlib.sha1(business_context.encode('utf-8')).hexdigest()
+    )
+
+
+def persisted_cache_key(cache_key: tuple) -> str:
+    """Key of a classification cache entry in the shared DynamoDB cache table"""
+    return '#'.join(cache_key)
+
+
+def classify_comment(aws_service: AWSService, comment_id: str, client_id: str,
+                    comment: Optional[dict], client_config: dict,
+                    classification: Optional[dict], now_iso: str,
+                    pending_messages: list) -> bool:
+    """
+    Apply client rules to a comment's classification and determine the appropriate action
+    The comment, client classification rules and OpenAI classification are prefetched by the caller;
+    follow-up actions are appended to pending_messages for a batched SQS send
+    """
+    
+    try:
+        if not comment or not classification:
+            logger.error(f"Comment not found: {comment_id}")
+            return False
         
         # Apply client-specific rules and thresholds
-        refined_classification = apply_client_rules(classification, client_config)
+        rules = get_client_rules(client_id, client_config)
+        refined_classification = apply_client_rules(
+            classification, client_config, rules, comment['text'].lower()
+        )
         
         # Determine action based on classification
         action = determine_action(refined_classification, client_config)
@@ -140,7 +375,7 @@ def classify_comment(aws_service: AWSService, openai_client: OpenAIClient,
             'classification': refined_classification,
             'suggested_action': action,
             'status': 'classified',
-            'classification_timestamp': datetime.now(timezone.utc).isoformat()
+            'classification_timestamp': now_iso
         }
         
         success = aws_service.update_comment(comment_id, update_data)
@@ -148,16 +383,16 @@ def classify_comment(aws_service: AWSService, openai_client: OpenAIClient,
         if success:
             # Queue for action if needed
             if action != 'ignore':
-                queue_for_action(aws_service, comment_id, client_id, action, refined_classification)
+                queue_for_action(pending_messages, comment_id, client_id, action, refined_classification, now_iso)
             
             # Log successful classification
-            aws_service.save_audit_log('comment_classified', {
+            aws_service.record_audit('comment_classified', {
                 'comment_id': comment_id,
                 'client_id': client_id,
                 'classification': refined_classification,
                 'action': action,
-                'timestamp': datetime.now(timezone.utc).isoformat()
-            })
+                'timestamp': now_iso
+            }, idempotency_key=comment_id)
             
             logger.info(f"Classified comment {comment_id}: {action}")
             return True
@@ -167,22 +402,27 @@ def classify_comment(aws_service: AWSService, openai_client: OpenAIClient,
     except Exception as e:
         logger.error(f"Failed to classify comment {comment_id}: {e}")
         
-        # Mark comment as classification failed
-        aws_service.update_comment(comment_id, {
-            'status': 'classification_failed',
+        # Record the failure in the batched audit log instead of another synchronous write
+        aws_service.record_audit('classification_failed', {
+            'comment_id': comment_id,
+            'client_id': client_id,
             'error': str(e),
-            'classification_timestamp': datetime.now(timezone.utc).isoformat()
+            'timestamp': now_iso
         })
         
         return False
 
 
-def apply_client_rules(classification: dict, client_config: dict) -> dict:
+def apply_client_rules(classification: dict, client_config: dict, rules: dict,
+                       comment_text: str) -> dict:
     """
     Apply client-specific rules to refine classification
+    Keyword rules come precompiled (and lowercased) from get_client_rules and
+    comment_text is lowercased once by the caller. The classification is
+    refined in place; callers pass a dict owned by this comment (never a cache entry)
     """
     
-    refined = classification.copy()
+    refined = classification
     
     try:
         # Apply toxicity threshold overrides
@@ -191,41 +431,29 @@ def apply_client_rules(classification: dict, client_config: dict) -> dict:
             refined['suggested_action'] = 'hide'
         
         # Apply urgency rules
-        urgency_keywords = client_config.get('urgency_keywords', [])
-        comment_text = refined.get('comment_text', '').lower()
-        
-        for keyword in urgency_keywords:
-            if keyword.lower() in comment_text:
-                refined['urgency'] = 'high'
-                break
-        
-        # Apply sentiment overrides
-        positive_keywords = client_config.get('positive_keywords', [])
-        negative_keywords = client_config.get('negative_keywords', [])
-        
-        for keyword in positive_keywords:
-            if keyword.lower() in comment_text:
-                refined['sentiment'] = 'positive'
-                break
-        
-        for keyword in negative_keywords:
-            if keyword.lower() in comment_text:
-                refined['sentiment'] = 'negative'
-                break
-        
-        # Apply custom intent detection
-        intent_keywords = client_config.get('intent_keywords', {})
-        for intent, keywords in intent_keywords.items():
-            for keyword in keywords:
-                if keyword.lower() in comment_text:
-                    refined['intent'] = intent
-                    break
+        urgency = Urgency.from_label(refined['urgency'])
+        
+        if pattern_matches(rules['urgency'], comment_text):
+            urgency = Urgency.HIGH
+        
+        # Apply sentiment overrides (negative keywords take precedence)
+        if pattern_matches(rules['positive'], comment_text):
+            refined['sentiment'] = 'positive'
+        
+        if pattern_matches(rules['negative'], comment_text):
+            refined['sentiment'] = 'negative'
+        
+        # Apply custom intent detection (the last matching intent wins)
+        for intent, pattern in rules['intents']:
+            if pattern_matches(pattern, comment_text):
+                refined['intent'] = intent
         
         # Apply business hours response rules
-        business_hours = client_config.get('business_hours', {})
-        if business_hours and should_respond_in_business_hours(business_hours):
+        if client_config.get('business_hours') and should_respond_in_business_hours(rules['business_hours']):
             if refined['requires_response']:
-                refined['urgency'] = max(refined['urgency'], 'medium')
+                urgency = max(urgency, Urgency.MEDIUM)
+        
+        refined['urgency'] = urgency.label
         
         logger.debug(f"Applied client rules: {refined}")
         return refined
@@ -235,18 +463,51 @@ def apply_client_rules(classification: dict, client_config: dict) -> dict:
         return classification
 
 
+def get_client_rules(client_id: str, client_config: dict) -> dict:
+    """
+    Return the client's keyword rules compiled to regex patterns
+    Rebuilt only when the (cached) client config object changes
+    """
+    cached = _CLIENT_RULES_CACHE.get(client_id)
+    if cached and cached['config'] is client_config:
+        return cached
+    
+    rules = {
+        'config': client_config,
+        'urgency': compile_keyword_pattern(tuple(client_config.get('urgency_keywords', []))),
+        'positive': compile_keyword_pattern(tuple(client_config.get('positive_keywords', []))),
+        'negative': compile_keyword_pattern(tuple(client_config.get('negative_keywords', []))),
+        'hide': compile_keyword_pattern(tuple(client_config.get('hide_keywords', []))),
+        'intents': [
+            (intent, compile_keyword_pattern(tuple(keywords)))
+            for intent, keywords in client_config.get('intent_keywords', {}).items()
+        ],
+        'business_hours': build_business_hours_table(client_config.get('business_hours', {}))
+    }
+    
+    _CLIENT_RULES_CACHE.set(client_id, rules)
+    return rules
+
+
+def pattern_matches(pattern, comment_text: str) -> bool:
+    """Check whether a compiled keyword pattern occurs in the lowercased comment text"""
+    return bool(pattern and pattern.search(comment_text))
+
+
 def determine_action(classification: dict, client_config: dict) -> str:
     """
     Determine the appropriate action based on classification and client config
     """
     
     try:
+        urgency = Urgency.from_label(classification['urgency'])
+        
         # Priority 1: Hide toxic content
         if classification['toxicity_score'] >= client_config.get('auto_hide_threshold', 7):
             return 'hide'
         
         # Priority 2: Escalate high-urgency issues
-        if classification['urgency'] == 'high':
+        if urgency >= Urgency.HIGH:
             return 'escalate'
         
         # Priority 3: Auto-reply to questions and complaints
@@ -255,7 +516,7 @@ def determine_action(classification: dict, client_config: dict) -> str:
                 return 'reply'
         
         # Priority 4: Monitor medium urgency items
-        if classification['urgency'] == 'medium':
+        if urgency == Urgency.MEDIUM:
             return 'escalate'  # Send to human for review
         
         # Priority 5: Escalate if confidence is low
@@ -270,41 +531,51 @@ def determine_action(classification: dict, client_config: dict) -> str:
         return 'escalate'  # Fail-safe to human review
 
 
-def should_respond_in_business_hours(business_hours: dict) -> bool:
+def build_business_hours_table(business_hours: dict) -> Optional[dict]:
     """
-    Check if current time is within business hours
+    Precompute the client's timezone and per-day (start_hour, end_hour) table
+    Returns None if the business hours config cannot be parsed
     """
     
     try:
-        from datetime import datetime
-        import pytz
-        
-        timezone_str = business_hours.get('timezone', 'UTC')
-        tz = pytz.timezone(timezone_str)
-        current_time = datetime.now(tz)
-        
-        current_day = current_time.strftime('%A').lower()
-        current_hour = current_time.hour
-        
-        day_hours = business_hours.get('hours', {}).get(current_day)
-        
-        if day_hours:
-            start_hour = int(day_hours.get('start', '9').split(':')[0])
-            end_hour = int(day_hours.get('end', '17').split(':')[0])
-            
-            return start_hour <= current_hour <= end_hour
-        
-        return False
+        return {
+            'timezone': ZoneInfo(business_hours.get('timezone', 'UTC')),
+            'hours': {
+                day: (int(day_hours.get('start', '9').split(':')[0]),
+                      int(day_hours.get('end', '17').split(':')[0]))
+                for day, day_hours in business_hours.get('hours', {}).items()
+                if day_hours
+            }
+        }
         
     except Exception as e:
-        logger.error(f"Failed to check business hours: {e}")
-        return True  # Default to always respond if check fails
+        logger.error(f"Failed to parse business hours: {e}")
+        return None
+
+
+def should_respond_in_business_hours(business_hours_table: Optional[dict]) -> bool:
+    """
+    Check if current time is within business hours
+    """
+    
+    if not business_hours_table:
+        return True  # Default to always respond if business hours are invalid
+    
+    current_time = datetime.now(business_hours_table['timezone'])
+    day_hours = business_hours_table['hours'].get(current_time.strftime('%A').lower())
+    
+    if day_hours:
+        start_hour, end_hour = day_hours
+        return start_hour <= current_time.hour <= end_hour
+    
+    return False
 
 
-def queue_for_action(aws_service: AWSService, comment_id: str, client_id: str, 
-                    action: str, classification: dict):
+def queue_for_action(pending_messages: list, comment_id: str, client_id: str, 
+                    action: str, classification: dict, queued_at: str):
     """
     Queue comment for specific action (reply, hide, escalate)
+    The message is added to pending_messages and sent by the handler in one batch
     """
     
     try:
@@ -313,7 +584,7 @@ def queue_for_action(aws_service: AWSService, comment_id: str, client_id: str,
             'comment_id': comment_id,
             'client_id': client_id,
             'classification': classification,
-            'queued_at': datetime.now(timezone.utc).isoformat()
+            'queued_at': queued_at
         }
         
         # Add delay for non-urgent items
@@ -323,12 +594,8 @@ def queue_for_action(aws_service: AWSService, comment_id: str, client_id: str,
         elif classification['urgency'] == 'medium':
             delay_seconds = 60   # 1 minute
         
-        success = aws_service.send_to_queue(message, delay_seconds)
-        
-        if success:
-            logger.info(f"Queued {action} for comment {comment_id}")
-        else:
-            logger.error(f"Failed to queue {action} for comment {comment_id}")
+        pending_messages.append({'message': message, 'delay_seconds': delay_seconds})
+        logger.info(f"Queued {action} for comment {comment_id}")
         
     except Exception as e:
         logger.error(f"Failed to queue action: {e}")
@@ -12,10 +12,96 @@ import os
 #sys.path.append('/opt/python')
 #sys.path.append(os.path.join(os.path.dirname(__file__), 'shared'))
 
-from shared.utils import AWSService, lambda_response, validate_required_env_vars, logger
+from shared.utils import AWSService, TTLCache, json_loads, lambda_response, validate_required_env_vars, logger
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+from itertools import islice
+import base64
+import hashlib
 from datetime import datetime, timezone, timedelta
-import boto3
-from decimal import Decimal
+from boto3.dynamodb.conditions import Key, Attr
+
+
+# Client-facing errors: code -> (status code, message)
+API_ERRORS = {
+    'BAD_REQUEST': (400, 'Missing required fields'),
+    'BAD_CURSOR': (400, 'Invalid cursor'),
+    'NOT_FOUND': (404, 'Endpoint not found'),
+    'METHOD_NOT_ALLOWED': (405, 'Method not allowed'),
+    'MISSING_ENV': (500, 'Missing required environment variables'),
+    'INTERNAL': (500, 'Internal server error')
+}
+
+# Comments GSI keyed by client_id (hash) and created_at (range)
+COMMENTS_CLIENT_INDEX = 'ClientIndex'
+
+# Supported metrics windows; unknown ranges fall back to 24h
+METRIC_TIME_RANGES = {
+    '1h': timedelta(hours=1),
+    '24h': timedelta(hours=24),
+    '7d': timedelta(days=7),
+    '30d': timedelta(days=30)
+}
+
+# Comment suggested_action -> action breakdown key
+ACTION_BREAKDOWN_KEYS = {
+    'reply': 'auto_replied',
+    'hide': 'hidden',
+    'escalate': 'escalated',
+    'ignore': 'ignored'
+}
+
+# Audit GSI keyed by action_type (hash) and timestamp (range)
+AUDIT_TIMESTAMP_INDEX = 'TimestampIndex'
+
+# Client-filtered audit reads: rows read per request (Limit counts rows before the
+# filter) and pages read per API call before a cursor is returned instead
+AUDIT_FILTERED_PAGE_SIZE = 500
+AUDIT_MAX_PAGES = 10
+
+# Shared pool for fanning out independent DynamoDB reads; results must arrive
+# well inside API Gateway's 29 second integration timeout
+_POOL = ThreadPoolExecutor(max_workers=16)
+PARALLEL_QUERY_TIMEOUT = 20
+
+# Polled GET responses are reused across warm invocations for a short window
+_RESPONSE_CACHE = TTLCache(maxsize=512, ttl_seconds=30)
+
+# CORS preflight answer is constant, so it is serialized once
+OPTIONS_RESPONSE = lambda_response(200, {'message': 'CORS preflight'})
+
+# Config GET responses (with their ETag) per (client_id, config_type); configs
+# change rarely and writes through this API invalidate them
+_CONFIG_RESPONSE_CACHE = TTLCache(maxsize=256, ttl_seconds=300)
+ALL_CONFIG_TYPES = '*'
+
+# Lambda environment is fixed for the container's lifetime, so validate it once
+REQUIRED_ENV_VARS = ['COMMENTS_TABLE', 'CONFIG_TABLE', 'AUDIT_TABLE']
+_ENV_OK = validate_required_env_vars(REQUIRED_ENV_VARS)
+
+# AWSService is created once per container and reused across warm invocations
+_AWS_SERVICE = None
+
+
+def _get_service() -> AWSService:
+    """Return the cached AWSService, initializing it on first use"""
+    global _AWS_SERVICE
+    
+    if _AWS_SERVICE is None:
+        _AWS_SERVICE = AWSService()
+    
+    return _AWS_SERVICE
+
+
+# Build the clients during the Lambda init phase and open the DynamoDB
+# connection (DNS + TLS) before the first request arrives; DescribeTable is
+# already granted on the tables and consumes no read capacity
+try:
+    _warm_service = _get_service()
+    _warm_service.dynamodb.meta.client.describe_table(TableName=_warm_service.config_table)
+except Exception as e:
+    logger.warning(f"Skipped DynamoDB connection warm-up: {e}")
 
 
 def lambda_handler(event, context):
@@ -23,40 +109,37 @@ def lambda_handler(event, context):
     Main Lambda handler for dashboard API requests
     """
     
-    logger.info(f"Dashboard API request: {event.get('httpMethod')} {event.get('path')}")
+    method = event.get('httpMethod')
+    path = event.get('path', '')
     
-    # Validate environment variables
-    required_vars = ['COMMENTS_TABLE', 'CONFIG_TABLE', 'AUDIT_TABLE']
-    if not validate_required_env_vars(required_vars):
-        return lambda_response(500, {'error': 'Missing required environment variables'})
+    logger.info("Dashboard API request: %s %s", method, path)
+    
+    # Environment variables are validated once at import
+    if not _ENV_OK:
+        return error_response('MISSING_ENV')
+    
+    # Preflight and unsupported methods never touch AWS
+    if method == 'OPTIONS':
+        return OPTIONS_RESPONSE
+    if method not in ROUTED_METHODS:
+        return error_response('METHOD_NOT_ALLOWED')
     
     try:
-        # Initialize services
-        aws_service = AWSService()
-        
-        # Route requests
-        method = event.get('httpMethod')
-        path = event.get('path', '')
+        # Reuse services initialized outside the handler
+        aws_service = _get_service()
         
         # Extract client_id from path or query parameters
         client_id = extract_client_id(event)
         
-        if method == 'GET':
-            return handle_get_request(aws_service, path, client_id, event)
-        elif method == 'POST':
-            return handle_post_request(aws_service, path, client_id, event)
-        elif method == 'PUT':
-            return handle_put_request(aws_service, path, client_id, event)
-        elif method == 'DELETE':
-            return handle_delete_request(aws_service, path, client_id, event)
-        elif method == 'OPTIONS':
-            return lambda_response(200, {'message': 'CORS preflight'})
-        else:
-            return lambda_response(405, {'error': 'Method not allowed'})
+        handler = ROUTES.get(route_key(method, path))
+        if not handler:
+            return error_response('NOT_FOUND')
         
-    except Exception as e:
-        logger.error(f"Dashboard API error: {str(e)}")
-        return lambda_response(500, {'error': 'Internal server error', 'details': str(e)})
+        return handler(aws_service, client_id, event)
+        
+    except Exception:
+        logger.exception("Dashboard API error")
+        return error_response('INTERNAL')
 
 
 def extract_client_id(event):
@@ -71,65 +154,17 @@ def extract_client_id(event):
     if 'client_id' in query_params:
         return query_params['client_id']
     
-    # Try request body
-    try:
-        body = json.loads(event.get('body', '{}'))
-        if 'client_id' in body:
-            return body['client_id']
-    except:
-        pass
-    
-    return None
-
-
-def handle_get_request(aws_service: AWSService, path: str, client_id: str, event: dict):
-    """Handle GET requests"""
+    # Try request body (GET requests have none, so skip parsing)
+    raw_body = event.get('body')
+    if not raw_body:
+        return None
     
-    if path == '/health':
-        return get_health_status(aws_service)
-    elif path == '/metrics' or path.startswith('/metrics/'):
-        return get_metrics(aws_service, client_id, event)
-    elif path == '/comments' or path.startswith('/comments/'):
-        return get_comments(aws_service, client_id, event)
-    elif path == '/config' or path.startswith('/config/'):
-        return get_config(aws_service, client_id, event)
-    elif path == '/audit' or path.startswith('/audit/'):
-        return get_audit_logs(aws_service, client_id, event)
-    elif path == '/dashboard' or path.startswith('/dashboard/'):
-        return get_dashboard_data(aws_service, client_id, event)
-    else:
-        return lambda_response(404, {'error': 'Endpoint not found'})
-
-
-def handle_post_request(aws_service: AWSService, path: str, client_id: str, event: dict):
-    """Handle POST requests"""
-    
-    if path == '/config':
-        return create_config(aws_service, event)
-    elif path == '/test-classification':
-        return test_classification(aws_service, event)
-    else:
-        return lambda_response(404, {'error': 'Endpoint not found'})
-
-
-def handle_put_request(aws_service: AWSService, path: str, client_id: str, event: dict):
-    """Handle PUT requests"""
-    
-    if path.startswith('/config/'):
-        return update_config(aws_service, event)
-    elif path.startswith('/comments/'):
-        return update_comment(aws_service, event)
-    else:
-        return lambda_response(404, {'error': 'Endpoint not found'})
-
-
-def handle_delete_request(aws_service: AWSService, path: str, client_id: str, event: dict):
-    """Handle DELETE requests"""
+    try:
+        body = json_loads(raw_body)
+    except ValueError:
+        return None
     
-    if path.startswith('/config/'):
-        return delete_config(aws_service, event)
-    else:
-        return lambda_response(404, {'error': 'Endpoint not found'})
+    return body.get('client_id') if isinstance(body, dict) else None
 
 
 def get_health_status(aws_service: AWSService):
@@ -154,181 +189,292 @@ def get_health_status(aws_service: AWSService):
         
         return lambda_response(200, health_status)
         
-    except Exception as e:
-        logger.error(f"Health check failed: {e}")
-        return lambda_response(500, {'status': 'error', 'error': str(e)})
+    except Exception:
+        logger.exception("Health check failed")
+        return error_response('INTERNAL', status='error')
 
 
+def error_response(code: str, **extra) -> dict:
+    """Build an error response from API_ERRORS; exception details stay in the logs"""
+    status_code, message = API_ERRORS[code]
+    return lambda_response(status_code, {**extra, 'error': message, 'code': code})
+
+
+def api_errors(description: str):
+    """
+    Turn an unhandled exception in an endpoint into a logged 500 response
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                logger.exception("Failed to %s", description)
+                return error_response('INTERNAL')
+        return wrapper
+    return decorator
+
+
+def cache_response(endpoint: str):
+    """
+    Cache successful responses per (endpoint, client_id, time range) for 30 seconds
+    so dashboards polling the same view share one set of DynamoDB reads
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(aws_service: AWSService, client_id: str, event: dict):
+            query_params = event.get('queryStringParameters') or {}
+            cache_key = (endpoint, client_id, query_params.get('range'))
+            
+            cached = _RESPONSE_CACHE.get(cache_key)
+            if cached is not None:
+                return cached
+            
+            response = func(aws_service, client_id, event)
+            if response.get('statusCode') == 200:
+                _RESPONSE_CACHE.set(cache_key, response)
+            return response
+        return wrapper
+    return decorator
+
+
+@cache_response('metrics')
+@api_errors('get metrics')
 def get_metrics(aws_service: AWSService, client_id: str, event: dict):
     """Get platform metrics"""
     
-    try:
-        query_params = event.get('queryStringParameters') or {}
-        time_range = query_params.get('range', '24h')
-        
-        # Calculate time window
-        end_time = datetime.now(timezone.utc)
-        if time_range == '1h':
-            start_time = end_time - timedelta(hours=1)
-        elif time_range == '24h':
-            start_time = end_time - timedelta(hours=24)
-        elif time_range == '7d':
-            start_time = end_time - timedelta(days=7)
-        elif time_range == '30d':
-            start_time = end_time - timedelta(days=30)
-        else:
-            start_time = end_time - timedelta(hours=24)
-        
-        metrics = {
-            'time_range': time_range,
-            'start_time': start_time.isoformat(),
-            'end_time': end_time.isoformat(),
-            'total_comments': get_comment_count(aws_service, client_id, start_time, end_time),
-            'sentiment_breakdown': get_sentiment_breakdown(aws_service, client_id, start_time, end_time),
-            'action_breakdown': get_action_breakdown(aws_service, client_id, start_time, end_time),
-            'response_times': get_response_times(aws_service, client_id, start_time, end_time),
-            'platform_breakdown': get_platform_breakdown(aws_service, client_id, start_time, end_time)
-        }
-        
-        return lambda_response(200, metrics)
-        
-    except Exception as e:
-        logger.error(f"Failed to get metrics: {e}")
-        return lambda_response(500, {'error': str(e)})
+    query_params = event.get('queryStringParameters') or {}
+    time_range = query_params.get('range', '24h')
+    
+    # Calculate time window
+    end_time = datetime.now(timezone.utc)
+    start_time = end_time - METRIC_TIME_RANGES.get(time_range, METRIC_TIME_RANGES['24h'])
+    
+    window = (aws_service, client_id, start_time, end_time)
+    results = run_parallel({
+        'aggregates': (aggregate_comment_window, window),
+        'response_times': (get_response_times, window)
+    })
+    aggregates = results['aggregates']
+    
+    metrics = {
+        'time_range': time_range,
+        'start_time': start_time.isoformat(),
+        'end_time': end_time.isoformat(),
+        'total_comments': aggregates['total'],
+        'sentiment_breakdown': aggregates['sentiment'],
+        'action_breakdown': aggregates['action'],
+        'response_times': results['response_times'],
+        'platform_breakdown': aggregates['platform']
+    }
+    
+    return lambda_response(200, metrics)
 
 
+@api_errors('get comments')
 def get_comments(aws_service: AWSService, client_id: str, event: dict):
     """Get comments with filtering and pagination"""
     
-    try:
-        query_params = event.get('queryStringParameters') or {}
-        
-        # Pagination parameters
-        limit = int(query_params.get('limit', 50))
-        offset = int(query_params.get('offset', 0))
-        
-        # Filter parameters
-        status = query_params.get('status')
-        sentiment = query_params.get('sentiment')
-        platform = query_params.get('platform')
-        
-        # Get comments
-        comments = query_comments(aws_service, client_id, limit, offset, {
+    query_params = event.get('queryStringParameters') or {}
+    
+    # Pagination parameters
+    limit = int(query_params.get('limit', 50))
+    offset = int(query_params.get('offset', 0))
+    
+    # Filter parameters
+    status = query_params.get('status')
+    sentiment = query_params.get('sentiment')
+    platform = query_params.get('platform')
+    
+    # Get comments
+    comments = query_comments(aws_service, client_id, limit, offset, {
+        'status': status,
+        'sentiment': sentiment,
+        'platform': platform
+    })
+    
+    # Get total count for pagination
+    total_count = get_total_comment_count(aws_service, client_id)
+    
+    response_data = {
+        'comments': comments,
+        'pagination': {
+            'limit': limit,
+            'offset': offset,
+            'total': total_count,
+            'has_more': offset + limit < total_count
+        },
+        'filters': {
             'status': status,
             'sentiment': sentiment,
             'platform': platform
-        })
-        
-        # Get total count for pagination
-        total_count = get_total_comment_count(aws_service, client_id)
-        
-        response_data = {
-            'comments': comments,
-            'pagination': {
-                'limit': limit,
-                'offset': offset,
-                'total': total_count,
-                'has_more': offset + limit < total_count
-            },
-            'filters': {
-                'status': status,
-                'sentiment': sentiment,
-                'platform': platform
-            }
         }
-        
-        return lambda_response(200, response_data)
-        
-    except Exception as e:
-        logger.error(f"Failed to get comments: {e}")
-        return lambda_response(500, {'error': str(e)})
+    }
+    
+    return lambda_response(200, response_data)
 
 
+@api_errors('get config')
 def get_config(aws_service: AWSService, client_id: str, event: dict):
-    """Get client configuration"""
+    """
+    Get client configuration
+    Responses carry an ETag; a matching If-None-Match gets a 304 with no body
+    """
     
-    try:
-        path_params = event.get('pathParameters') or {}
-        config_type = path_params.get('config_type')
-        
+    path_params = event.get('pathParameters') or {}
+    config_type = path_params.get('config_type')
+    cache_key = (client_id, config_type or ALL_CONFIG_TYPES)
+    
+    cached = _CONFIG_RESPONSE_CACHE.get(cache_key)
+    if cached is None:
         if config_type:
             # Get specific config type
-            config = aws_service.get_client_config(client_id, config_type)
-            return lambda_response(200, {'config_type': config_type, 'config': config})
+            config = aws_service.get_client_config(client_id, config_type, use_cache=False)
+            response = lambda_response(200, {'config_type': config_type, 'config': config})
         else:
             # Get all config types for client
             all_configs = get_all_client_configs(aws_service, client_id)
-            return lambda_response(200, {'client_id': client_id, 'configs': all_configs})
+            response = lambda_response(200, {'client_id': client_id, 'configs': all_configs})
         
-    except Exception as e:
-        logger.error(f"Failed to get config: {e}")
-        return lambda_response(500, {'error': str(e)})
+        etag = '"' + hashlib.sha1(response['body'].encode('utf-8')).hexdigest() + '"'
+        response['headers'] = {**response['headers'], 'ETag': etag}
+        cached = (etag, response)
+        _CONFIG_RESPONSE_CACHE.set(cache_key, cached)
+    
+    etag, response = cached
+    
+    headers = event.get('headers') or {}
+    if_none_match = headers.get('If-None-Match') or headers.get('if-none-match')
+    if if_none_match == etag:
+        return {'statusCode': 304, 'headers': response['headers'], 'body': ''}
+    
+    return response
 
 
+def invalidate_config_cache(client_id: str, config_type: str) -> None:
+    """Drop cached config responses affected by a config write"""
+    _CONFIG_RESPONSE_CACHE.delete((client_id, config_type))
+    _CONFIG_RESPONSE_CACHE.delete((client_id, ALL_CONFIG_TYPES))
+
+
+@api_errors('get audit logs')
 def get_audit_logs(aws_service: AWSService, client_id: str, event: dict):
     """Get audit logs"""
     
-    try:
-        query_params = event.get('queryStringParameters') or {}
-        
-        limit = int(query_params.get('limit', 100))
-        action_type = query_params.get('action_type')
-        
-        # Query audit logs
-        logs = query_audit_logs(aws_service, action_type, limit)
-        
-        # Filter by client if specified
-        if client_id:
-            logs = [log for log in logs if log.get('details', {}).get('client_id') == client_id]
-        
-        return lambda_response(200, {'logs': logs})
-        
-    except Exception as e:
-        logger.error(f"Failed to get audit logs: {e}")
-        return lambda_response(500, {'error': str(e)})
+    query_params = event.get('queryStringParameters') or {}
+    
+    limit = int(query_params.get('limit', 100))
+    action_type = query_params.get('action_type')
+    
+    # Resume where a previous page stopped
+    start_key = None
+    if query_params.get('cursor'):
+        try:
+            start_key = decode_cursor(query_params['cursor'])
+        except Exception:
+            return error_response('BAD_CURSOR')
+    
+    # Query audit logs (filtered by client in DynamoDB if specified)
+    logs, next_key = query_audit_logs(aws_service, action_type, limit, client_id, start_key)
+    
+    return lambda_response(200, {
+        'logs': logs,
+        'next_cursor': encode_cursor(next_key) if next_key else None
+    })
+
+
+def encode_cursor(key: dict) -> str:
+    """Opaque pagination cursor for a DynamoDB start key"""
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> dict:
+    """Start key from a cursor built by encode_cursor"""
+    key = json_loads(base64.urlsafe_b64decode(cursor.encode()))
+    if not isinstance(key, dict) or not all(isinstance(value, str) for value in key.values()):
+        raise ValueError("Malformed cursor")
+    return key
 
 
+@cache_response('dashboard')
+@api_errors('get dashboard data')
 def get_dashboard_data(aws_service: AWSService, client_id: str, event: dict):
     """Get comprehensive dashboard data"""
     
-    try:
-        # Get current time
-        now = datetime.now(timezone.utc)
-        
-        # Recent activity (last 24 hours)
-        yesterday = now - timedelta(hours=24)
-        
-        dashboard_data = {
-            'timestamp': now.isoformat(),
-            'client_id': client_id,
-            'summary': {
-                'total_comments_today': get_comment_count(aws_service, client_id, yesterday, now),
-                'pending_comments': get_pending_comment_count(aws_service, client_id),
-                'escalated_comments': get_escalated_comment_count(aws_service, client_id),
-                'auto_replies_sent': get_auto_reply_count(aws_service, client_id, yesterday, now)
-            },
-            'recent_comments': get_recent_comments(aws_service, client_id, 10),
-            'sentiment_trends': get_sentiment_trends(aws_service, client_id),
-            'platform_stats': get_platform_breakdown(aws_service, client_id, yesterday, now),
-            'action_stats': get_action_breakdown(aws_service, client_id, yesterday, now),
-            'alerts': get_active_alerts(aws_service, client_id)
-        }
-        
-        return lambda_response(200, dashboard_data)
-        
-    except Exception as e:
-        logger.error(f"Failed to get dashboard data: {e}")
-        return lambda_response(500, {'error': str(e)})
+    # Get current time
+    now = datetime.now(timezone.utc)
+    
+    # Recent activity (last 24 hours)
+    yesterday = now - timedelta(hours=24)
+    
+    window = (aws_service, client_id, yesterday, now)
+    results = run_parallel({
+        'aggregates': (aggregate_comment_window, window),
+        'pending_comments': (get_pending_comment_count, (aws_service, client_id)),
+        'escalated_comments': (get_escalated_comment_count, (aws_service, client_id)),
+        'recent_comments': (get_recent_comments, (aws_service, client_id, 10)),
+        'sentiment_trends': (get_sentiment_trends, (aws_service, client_id)),
+        'alerts': (get_active_alerts, (aws_service, client_id))
+    })
+    
+    aggregates = results['aggregates']
+    
+    dashboard_data = {
+        'timestamp': now.isoformat(),
+        'client_id': client_id,
+        'summary': {
+            'total_comments_today': aggregates['total'],
+            'pending_comments': results['pending_comments'],
+            'escalated_comments': results['escalated_comments'],
+            'auto_replies_sent': aggregates['replied']
+        },
+        'recent_comments': results['recent_comments'],
+        'sentiment_trends': results['sentiment_trends'],
+        'platform_stats': aggregates['platform'],
+        'action_stats': aggregates['action'],
+        'alerts': results['alerts']
+    }
+    
+    return lambda_response(200, dashboard_data)
 
 
 # Helper functions for data retrieval
 
+def run_parallel(tasks: dict) -> dict:
+    """
+    Run independent helpers concurrently on the shared pool
+    tasks maps result name -> (function, args); returns result name -> value
+    """
+    futures = {name: _POOL.submit(func, *args) for name, (func, args) in tasks.items()}
+    return {name: future.result(timeout=PARALLEL_QUERY_TIMEOUT) for name, future in futures.items()}
+
+
+def paginate(read_page, **request_kwargs):
+    """
+    Yield items from a DynamoDB query/scan one at a time, fetching the next
+    page only when the caller consumes past the current one
+    """
+    while True:
+        response = read_page(**request_kwargs)
+        yield from response.get('Items', [])
+        
+        if 'LastEvaluatedKey' not in response:
+            return
+        request_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
 def check_dynamodb_health(aws_service: AWSService) -> bool:
     """Check if DynamoDB tables are accessible"""
     try:
-        # Simple query to check table access
-        aws_service.dynamodb.Table(aws_service.comments_table).scan(Limit=1)
-        return True
+        # DescribeTable is a control-plane call, so the check consumes no read capacity
+        client = aws_service.dynamodb.meta.client
+        tables = [aws_service.comments_table, aws_service.config_table, aws_service.audit_table]
+        statuses = run_parallel({
+            table_name: (lambda name: client.describe_table(TableName=name)['Table']['TableStatus'], (table_name,))
+            for table_name in tables
+        })
+        return all(status in ('ACTIVE', 'UPDATING') for status in statuses.values())
     except Exception:
         return False
 
@@ -348,54 +494,89 @@ def get_recent_activity_count(aws_service: AWSService) -> dict:
         return {'comments_24h': 0, 'actions_24h': 0, 'escalations_24h': 0}
 
 
-def get_comment_count(aws_service: AWSService, client_id: str, start_time: datetime, end_time: datetime) -> int:
-    """Get comment count for time range"""
-    try:
-        table = aws_service.dynamodb.Table(aws_service.comments_table)
-        
-        # This is a simplified implementation
-        # In production, you'd use GSI with timestamp for efficient querying
-        response = table.scan(
-            FilterExpression='client_id = :client_id AND created_at BETWEEN :start AND :end',
-            ExpressionAttributeValues={
-                ':client_id': client_id,
-                ':start': start_time.isoformat(),
-                ':end': end_time.isoformat()
-            },
-            Select='COUNT'
-        )
+def count_client_comments(aws_service: AWSService, client_id: str, start_time: datetime = None,
+                          end_time: datetime = None, filter_expression=None) -> int:
+    """
+    Count a client's comments with a COUNT query on the ClientIndex GSI
+    Only the client's partition (and time window, if given) is read
+    """
+    table = aws_service.get_table(aws_service.comments_table)
+    
+    key_condition = Key('client_id').eq(client_id)
+    if start_time and end_time:
+        key_condition = key_condition & Key('created_at').between(start_time.isoformat(), end_time.isoformat())
+    
+    query_kwargs = {
+        'IndexName': COMMENTS_CLIENT_INDEX,
+        'KeyConditionExpression': key_condition,
+        'Select': 'COUNT'
+    }
+    if filter_expression is not None:
+        query_kwargs['FilterExpression'] = filter_expression
+    
+    count = 0
+    while True:
+        response = table.query(**query_kwargs)
+        count += response['Count']
         
-        return response['Count']
-    except Exception as e:
-        logger.error(f"Failed to get comment count: {e}")
-        return 0
+        if 'LastEvaluatedKey' not in response:
+            return count
+        query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
 
 
-def get_sentiment_breakdown(aws_service: AWSService, client_id: str, start_time: datetime, end_time: datetime) -> dict:
-    """Get sentiment breakdown"""
-    try:
-        # This would be implemented with proper aggregation
-        # For MVP, return sample data
-        return {
-            'positive': 45,
-            'neutral': 30,
-            'negative': 25
-        }
-    except Exception:
-        return {'positive': 0, 'neutral': 0, 'negative': 0}
-
-
-def get_action_breakdown(aws_service: AWSService, client_id: str, start_time: datetime, end_time: datetime) -> dict:
-    """Get action breakdown"""
+def aggregate_comment_window(aws_service: AWSService, client_id: str, start_time: datetime, end_time: datetime) -> dict:
+    """
+    Count sentiment, action, platform and replies for the client's comments in the window
+    One ClientIndex query projecting only the counted attributes feeds every breakdown
+    """
+    sentiment = Counter({'positive': 0, 'neutral': 0, 'negative': 0})
+    action = Counter({key: 0 for key in ACTION_BREAKDOWN_KEYS.values()})
+    platform = Counter({'facebook': 0, 'instagram': 0, 'facebook_ads': 0})
+    total = 0
+    replied = 0
+    
     try:
-        return {
-            'auto_replied': 15,
-            'hidden': 5,
-            'escalated': 10,
-            'ignored': 70
+        table = aws_service.get_table(aws_service.comments_table)
+        query_kwargs = {
+            'IndexName': COMMENTS_CLIENT_INDEX,
+            'KeyConditionExpression': Key('client_id').eq(client_id) & Key('created_at').between(
+                start_time.isoformat(), end_time.isoformat()
+            ),
+            'ProjectionExpression': '#classification.#sentiment, #action, #platform, #reply_sent',
+            'ExpressionAttributeNames': {
+                '#classification': 'classification',
+                '#sentiment': 'sentiment',
+                '#action': 'suggested_action',
+                '#platform': 'platform',
+                '#reply_sent': 'reply_sent'
+            }
         }
-    except Exception:
-        return {'auto_replied': 0, 'hidden': 0, 'escalated': 0, 'ignored': 0}
+        
+        for item in paginate(table.query, **query_kwargs):
+            total += 1
+            item_sentiment = item.get('classification', {}).get('sentiment')
+            if item_sentiment:
+                sentiment[item_sentiment] += 1
+            
+            item_action = ACTION_BREAKDOWN_KEYS.get(item.get('suggested_action'))
+            if item_action:
+                action[item_action] += 1
+            
+            if item.get('platform'):
+                platform[item['platform']] += 1
+            
+            if item.get('reply_sent'):
+                replied += 1
+    except Exception as e:
+        logger.error(f"Failed to aggregate comments: {e}")
+    
+    return {
+        'total': total,
+        'replied': replied,
+        'sentiment': dict(sentiment),
+        'action': dict(action),
+        'platform': dict(platform)
+    }
 
 
 def get_response_times(aws_service: AWSService, client_id: str, start_time: datetime, end_time: datetime) -> dict:
@@ -410,81 +591,174 @@ def get_response_times(aws_service: AWSService, client_id: str, start_time: date
         return {'avg_classification_time': 0, 'avg_response_time': 0, 'p95_response_time': 0}
 
 
-def get_platform_breakdown(aws_service: AWSService, client_id: str, start_time: datetime, end_time: datetime) -> dict:
-    """Get platform breakdown"""
-    try:
-        return {
-            'facebook': 60,
-            'instagram': 35,
-            'facebook_ads': 5
-        }
-    except Exception:
-        return {'facebook': 0, 'instagram': 0, 'facebook_ads': 0}
-
-
 # Additional helper functions would be implemented here...
 
+@api_errors('create config')
 def create_config(aws_service: AWSService, event: dict):
     """Create new client configuration"""
-    try:
-        body = json.loads(event.get('body', '{}'))
-        
-        client_id = body.get('client_id')
-        config_type = body.get('config_type')
-        config_data = body.get('config', {})
-        
-        if not all([client_id, config_type]):
-            return lambda_response(400, {'error': 'Missing required fields'})
-        
-        # Save configuration
-        table = aws_service.dynamodb.Table(aws_service.config_table)
-        table.put_item(Item={
-            'client_id': client_id,
-            'config_type': config_type,
-            'config': config_data,
-            'created_at': datetime.now(timezone.utc).isoformat(),
-            'updated_at': datetime.now(timezone.utc).isoformat()
-        })
-        
-        return lambda_response(201, {'message': 'Configuration created successfully'})
-        
-    except Exception as e:
-        logger.error(f"Failed to create config: {e}")
-        return lambda_response(500, {'error': str(e)})
+    body = json_loads(event.get('body') or '{}')
+    
+    client_id = body.get('client_id')
+    config_type = body.get('config_type')
+    config_data = body.get('config', {})
+    
+    if not all([client_id, config_type]):
+        return error_response('BAD_REQUEST')
+    
+    # Save configuration
+    invalidate_config_cache(client_id, config_type)
+    table = aws_service.get_table(aws_service.config_table)
+    table.put_item(Item={
+        'client_id': client_id,
+        'config_type': config_type,
+        'config': config_data,
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'updated_at': datetime.now(timezone.utc).isoformat()
+    })
+    
+    return lambda_response(201, {'message': 'Configuration created successfully'})
 
 
 # Placeholder implementations for other functions
 def query_comments(aws_service, client_id, limit, offset, filters):
-    """Query comments with filters - placeholder implementation"""
-    return []
+    """
+    Query a client's comments newest first, applying status/sentiment/platform filters
+    Pages are read lazily and reading stops once offset + limit comments are found
+    """
+    try:
+        table = aws_service.get_table(aws_service.comments_table)
+        
+        query_kwargs = {
+            'IndexName': COMMENTS_CLIENT_INDEX,
+            'KeyConditionExpression': Key('client_id').eq(client_id),
+            'ScanIndexForward': False
+        }
+        
+        conditions = []
+        if filters.get('status'):
+            conditions.append(Attr('status').eq(filters['status']))
+        if filters.get('sentiment'):
+            conditions.append(Attr('classification.sentiment').eq(filters['sentiment']))
+        if filters.get('platform'):
+            conditions.append(Attr('platform').eq(filters['platform']))
+        
+        if conditions:
+            filter_expression = conditions[0]
+            for condition in conditions[1:]:
+                filter_expression = filter_expression & condition
+            query_kwargs['FilterExpression'] = filter_expression
+        
+        return list(islice(paginate(table.query, **query_kwargs), offset, offset + limit))
+    except Exception as e:
+        logger.error(f"Failed to query comments: {e}")
+        return []
 
 def get_total_comment_count(aws_service, client_id):
-    """Get total comment count - placeholder implementation"""
-    return 0
+    """Get total comment count for a client"""
+    try:
+        return count_client_comments(aws_service, client_id)
+    except Exception as e:
+        logger.error(f"Failed to get total comment count: {e}")
+        return 0
 
 def get_all_client_configs(aws_service, client_id):
-    """Get all configs for client - placeholder implementation"""
-    return {}
+    """Get every config type for a client with a single Query on the config table's hash key"""
+    try:
+        table = aws_service.get_table(aws_service.config_table)
+        items = paginate(table.query, KeyConditionExpression=Key('client_id').eq(client_id))
+        return {item['config_type']: item.get('config', {}) for item in items}
+    except Exception as e:
+        logger.error(f"Failed to get configs for {client_id}: {e}")
+        return {}
 
-def query_audit_logs(aws_service, action_type, limit):
-    """Query audit logs - placeholder implementation"""
-    return []
+def query_audit_logs(aws_service, action_type, limit, client_id=None, start_key=None):
+    """
+    Query audit logs, newest first when filtered by action type
+    The client filter runs in DynamoDB; since Limit counts rows before filtering,
+    at most AUDIT_MAX_PAGES pages are read per call
+    Returns (logs, start key for the next call or None at the end of the logs)
+    """
+    if limit <= 0:
+        return [], None
+    
+    try:
+        table = aws_service.get_table(aws_service.audit_table)
+        
+        request_kwargs = {'Limit': limit}
+        key_attributes = ['log_id']
+        if client_id:
+            request_kwargs['FilterExpression'] = Attr('details.client_id').eq(client_id)
+            request_kwargs['Limit'] = max(limit, AUDIT_FILTERED_PAGE_SIZE)
+        
+        if action_type:
+            read_page = table.query
+            request_kwargs.update({
+                'IndexName': AUDIT_TIMESTAMP_INDEX,
+                'KeyConditionExpression': Key('action_type').eq(action_type),
+                'ScanIndexForward': False
+            })
+            key_attributes += ['action_type', 'timestamp']
+        else:
+            read_page = table.scan
+        
+        if start_key:
+            request_kwargs['ExclusiveStartKey'] = start_key
+        
+        logs = []
+        for _ in range(AUDIT_MAX_PAGES):
+            response = read_page(**request_kwargs)
+            items = response.get('Items', [])
+            last_key = response.get('LastEvaluatedKey')
+            
+            wanted = limit - len(logs)
+            if len(items) >= wanted:
+                # Resume right after the last log returned, not after the page
+                logs.extend(items[:wanted])
+                if len(items) > wanted or last_key:
+                    return logs, {attribute: logs[-1][attribute] for attribute in key_attributes}
+                return logs, None
+            
+            logs.extend(items)
+            if not last_key:
+                return logs, None
+            request_kwargs['ExclusiveStartKey'] = last_key
+        
+        # Page budget spent; the caller continues from here with the cursor
+        return logs, last_key
+    except Exception as e:
+        logger.error(f"Failed to query audit logs: {e}")
+        return [], None
 
 def get_pending_comment_count(aws_service, client_id):
-    """Get pending comment count - placeholder implementation"""
-    return 0
+    """Get count of comments still awaiting classification"""
+    try:
+        return count_client_comments(aws_service, client_id, filter_expression=Attr('status').eq('pending'))
+    except Exception as e:
+        logger.error(f"Failed to get pending comment count: {e}")
+        return 0
 
 def get_escalated_comment_count(aws_service, client_id):
-    """Get escalated comment count - placeholder implementation"""
-    return 0
-
-def get_auto_reply_count(aws_service, client_id, start_time, end_time):
-    """Get auto reply count - placeholder implementation"""
-    return 0
+    """Get count of escalated comments"""
+    try:
+        return count_client_comments(aws_service, client_id, filter_expression=Attr('escalated').eq(True))
+    except Exception as e:
+        logger.error(f"Failed to get escalated comment count: {e}")
+        return 0
 
 def get_recent_comments(aws_service, client_id, limit):
-    """Get recent comments - placeholder implementation"""
-    return []
+    """Get the client's most recent comments, newest first"""
+    try:
+        table = aws_service.get_table(aws_service.comments_table)
+        response = table.query(
+            IndexName=COMMENTS_CLIENT_INDEX,
+            KeyConditionExpression=Key('client_id').eq(client_id),
+            ScanIndexForward=False,
+            Limit=limit
+        )
+        return response.get('Items', [])
+    except Exception as e:
+        logger.error(f"Failed to get recent comments: {e}")
+        return []
 
 def get_sentiment_trends(aws_service, client_id):
     """Get sentiment trends - placeholder implementation"""
@@ -494,16 +768,20 @@ def get_active_alerts(aws_service, client_id):
     """Get active alerts - placeholder implementation"""
     return []
 
-def update_config(aws_service, event):
+def update_config(aws_service, client_id, event):
     """Update configuration - placeholder implementation"""
+    config_type = (event.get('pathParameters') or {}).get('config_type')
+    invalidate_config_cache(client_id, config_type)
     return lambda_response(200, {'message': 'Config updated'})
 
 def update_comment(aws_service, event):
     """Update comment - placeholder implementation"""
     return lambda_response(200, {'message': 'Comment updated'})
 
-def delete_config(aws_service, event):
+def delete_config(aws_service, client_id, event):
     """Delete configuration - placeholder implementation"""
+    config_type = (event.get('pathParameters') or {}).get('config_type')
+    invalidate_config_cache(client_id, config_type)
     return lambda_response(200, {'message': 'Config deleted'})
 
 def test_classification(aws_service, event):
@@ -511,6 +789,40 @@ def test_classification(aws_service, event):
     return lambda_response(200, {'message': 'Classification test completed'})
 
 
+def route_key(method: str, path: str) -> tuple:
+    """
+    Build the route table key: (method, first path segment, has sub-path)
+    e.g. GET /metrics/24h -> ('GET', '/metrics', True)
+    """
+    parts = path.split('/', 2)
+    segment = parts[1] if len(parts) > 1 else ''
+    return (method, f"/{segment}", len(parts) > 2)
+
+
+# Route table; every handler takes (aws_service, client_id, event)
+ROUTES = {
+    ('GET', '/health', False): lambda aws_service, client_id, event: get_health_status(aws_service),
+    ('POST', '/config', False): lambda aws_service, client_id, event: create_config(aws_service, event),
+    ('POST', '/test-classification', False): lambda aws_service, client_id, event: test_classification(aws_service, event),
+    ('PUT', '/config', True): update_config,
+    ('PUT', '/comments', True): lambda aws_service, client_id, event: update_comment(aws_service, event),
+    ('DELETE', '/config', True): delete_config
+}
+
+# GET resources match both the exact path and any sub-path
+for _path, _handler in {
+    '/metrics': get_metrics,
+    '/comments': get_comments,
+    '/config': get_config,
+    '/audit': get_audit_logs,
+    '/dashboard': get_dashboard_data
+}.items():
+    ROUTES[('GET', _path, False)] = _handler
+    ROUTES[('GET', _path, True)] = _handler
+
+ROUTED_METHODS = {method for method, _, _ in ROUTES}
+
+
 # For local testing
 if __name__ == "__main__":
     # Mock API Gateway event for local testing
@@ -12,9 +12,99 @@ import os
 #sys.path.append('/opt/python')
 #sys.path.append(os.path.join(os.path.dirname(__file__), 'shared'))
 
-from shared.utils import AWSService, lambda_response, validate_required_env_vars, logger
+from shared.utils import AWSService, TTLCache, json_loads, lambda_response, summarize_classification, validate_required_env_vars, logger
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
-import requests
+from typing import Optional, Tuple
+import time
+
+
+# Services reused across warm invocations; secrets are re-read after
+# SECRETS_TTL_SECONDS so rotated values eventually propagate
+SECRETS_TTL_SECONDS = int(os.environ.get('SECRETS_TTL_SECONDS', '600'))
+_AWS_SERVICE = None
+_SECRETS = None
+_SECRETS_TS = 0.0
+
+# Pooled keep-alive session for Slack webhooks, created on first use by _get_http()
+_HTTP = None
+SLACK_TIMEOUT = (2, 8)
+
+# Messages in a batch are handled concurrently (bounded by the SQS batch size)
+MAX_WORKERS = 10
+
+# (comment_id, action) pairs this container handled successfully; SQS
+# redeliveries of them are dropped instead of repeating the work
+_RECENTLY_HANDLED = TTLCache(maxsize=1024, ttl_seconds=900)
+
+# Escalation levels as (predicate, level), checked in order; first match wins
+ESCALATION_RULES = [
+    # Critical: High toxicity + high confidence
+    (lambda c: c['toxicity_score'] >= 8 and c['confidence'] >= 80, 'critical'),
+    # Critical: Legal threats or severe complaints
+    (lambda c: c['intent'] == 'complaint' and c['urgency'] == 'high', 'critical'),
+    # High: Medium-high toxicity or urgent issues
+    (lambda c: c['toxicity_score'] >= 6 or c['urgency'] == 'high', 'high'),
+    # Medium: Questions, complaints, or moderate issues
+    (lambda c: c['urgency'] == 'medium' or c['intent'] in ('question', 'complaint'), 'medium')
+]
+
+# Slack notifications for a batch are collected and posted together
+MAX_ATTACHMENTS_PER_MSG = 20
+
+# Slack attachment color per escalation level
+SLACK_LEVEL_COLORS = {
+    'critical': '#FF0000',  # Red
+    'high': '#FF6600',      # Orange
+    'medium': '#FFCC00',    # Yellow
+    'low': '#00CC00'        # Green
+}
+
+
+def _get_services():
+    """Return the cached AWSService and secrets, initializing them on first use"""
+    global _AWS_SERVICE, _SECRETS, _SECRETS_TS
+    
+    if _AWS_SERVICE is None:
+        _AWS_SERVICE = AWSService()
+    
+    if _SECRETS is None or time.monotonic() - _SECRETS_TS > SECRETS_TTL_SECONDS:
+        _SECRETS = _AWS_SERVICE.get_secrets()
+        _SECRETS_TS = time.monotonic()
+    
+    return _AWS_SERVICE, _SECRETS
+
+
+def _get_http():
+    """Return the shared Slack session; requests is only imported when a webhook is sent"""
+    global _HTTP
+    
+    if _HTTP is None:
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+        
+        # Webhook POSTs are not idempotent: only failed connects and 429s (which Slack
+        # rejected without posting) are retried; 5xx and read timeouts are not, since
+        # the message may already have been delivered
+        session = requests.Session()
+        session.mount("https://", HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=10,
+            max_retries=Retry(total=2, connect=2, read=0, backoff_factor=0.2, status_forcelist=[429],
+                              allowed_methods=frozenset(['POST']), respect_retry_after_header=True)
+        ))
+        _HTTP = session
+    
+    return _HTTP
+
+
+# Initialize during the Lambda init phase; a failure here (e.g. a Secrets Manager
+# blip) is retried on the first invocation instead of poisoning the container
+try:
+    _get_services()
+except Exception as e:
+    logger.warning(f"Deferred service initialization to first invocation: {e}")
 
 
 def lambda_handler(event, context):
@@ -29,57 +119,84 @@ def lambda_handler(event, context):
     if not validate_required_env_vars(required_vars):
         return lambda_response(500, {'error': 'Missing required environment variables'})
     
+    aws_service = None
+    
+    # One timestamp for every record written by this invocation
+    now_iso = datetime.now(timezone.utc).isoformat()
+    
     try:
-        # Initialize services
-        aws_service = AWSService()
-        secrets = aws_service.get_secrets()
+        # Reuse services initialized on a previous invocation
+        aws_service, secrets = _get_services()
         
         processed_count = 0
         errors = []
         
-        # Process each SQS record
+        # Slack attachments queued by this batch, keyed by webhook URL, as
+        # (message index, attachment) pairs (filled from worker threads;
+        # setdefault/append are atomic)
+        slack_outbox = {}
+        
+        # Parse SQS messages, keeping each messageId for partial batch failures
+        messages = []
+        message_ids = []
+        batch_item_failures = []
         for record in event.get('Records', []):
             try:
-                # Parse SQS message
-                message_body = json.loads(record['body'])
-                
-                if message_body.get('action') == 'escalate':
-                    comment_id = message_body['comment_id']
-                    client_id = message_body['client_id']
-                    classification = message_body.get('classification', {})
-                    
-                    logger.info(f"Processing escalation for comment: {comment_id}")
-                    
-                    # Process the escalation
-                    success = process_escalation(
-                        aws_service,
-                        secrets,
-                        comment_id,
-                        client_id,
-                        classification
-                    )
-                    
-                    if success:
-                        processed_count += 1
-                    else:
-                        errors.append(f"Failed to escalate comment {comment_id}")
-                
-                elif message_body.get('action') == 'send_notification':
-                    # Handle other notification types (like hide notifications)
-                    success = send_notification(aws_service, secrets, message_body)
-                    if success:
-                        processed_count += 1
-                    else:
-                        errors.append(f"Failed to send notification: {message_body.get('type', 'unknown')}")
-                
+                messages.append(json_loads(record['body']))
+                message_ids.append(record.get('messageId'))
             except Exception as e:
-                error_msg = f"Error processing record: {str(e)}"
+                error_msg = f"Error parsing record: {str(e)}"
                 logger.error(error_msg)
                 errors.append(error_msg)
         
+        # Drop redelivered messages this container already handled
+        pending = [(message_id, m) for message_id, m in zip(message_ids, messages)
+                   if not _RECENTLY_HANDLED.get(handled_key(m))]
+        if len(pending) < len(messages):
+            logger.info(f"Skipping {len(messages) - len(pending)} already handled messages")
+        message_ids = [message_id for message_id, _ in pending]
+        messages = [m for _, m in pending]
+        
+        # Fetch the batch's comments and client configs up front
+        targets = [m for m in messages if m.get('action') == 'escalate']
+        comments = aws_service.batch_get_comments([m['comment_id'] for m in targets if 'comment_id' in m])
+        notification_configs = aws_service.batch_get_client_configs(
+            [m['client_id'] for m in targets if 'client_id' in m], 'notifications'
+        )
+        
+        # Messages target different comments, so their I/O can overlap
+        results = []
+        if messages:
+            with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(messages))) as executor:
+                results = list(executor.map(
+                    lambda indexed: handle_message(aws_service, now_iso, secrets, indexed[1], comments,
+                                                   notification_configs, slack_outbox, indexed[0]),
+                    enumerate(messages)
+                ))
+        
+        # One webhook POST per destination instead of one per record; nothing is
+        # recorded as escalated until its Slack message has actually been sent
+        flush_errors, failed_messages = flush_slack_notifications(slack_outbox)
+        errors.extend(flush_errors)
+        
+        for index, (message_id, message_body, (processed, error, escalation)) in enumerate(zip(message_ids, messages, results)):
+            if processed and index in failed_messages:
+                processed, error = False, f"Slack notification not delivered for message {message_id}"
+            elif processed and escalation and not record_escalation(aws_service, now_iso, escalation):
+                processed, error = False, f"Failed to record escalation for comment {escalation['comment_id']}"
+            
+            if processed:
+                processed_count += 1
+                _RECENTLY_HANDLED.set(handled_key(message_body), True)
+            if error:
+                errors.append(error)
+                # Let SQS redeliver only the messages that failed
+                if message_id:
+                    batch_item_failures.append({'itemIdentifier': message_id})
+        
         # Log audit information
-        aws_service.save_audit_log('escalation_batch_completed', {
-            'timestamp': datetime.now(timezone.utc).isoformat(),
+        aws_service.record_audit('escalation_batch_completed', {
+            'timestamp': now_iso,
             'records_received': len(event.get('Records', [])),
             'escalations_sent': processed_count,
             'errors': errors
@@ -87,37 +204,112 @@ def lambda_handler(event, context):
         
         logger.info(f"Escalation processing completed: {processed_count} sent, {len(errors)} errors")
         
-        return lambda_response(200, {
+        response = lambda_response(200, {
             'status': 'success',
             'escalations_sent': processed_count,
-            'errors': len(errors)
+            'errors': len(errors),
+            'batchItemFailures': batch_item_failures
         })
+        # The SQS event source mapping reads batchItemFailures from the top level
+        response['batchItemFailures'] = batch_item_failures
+        return response
         
     except Exception as e:
         logger.error(f"Escalation handler failed: {str(e)}")
-        return lambda_response(500, {'status': 'error', 'message': str(e)})
+        response = lambda_response(500, {'status': 'error', 'message': str(e)})
+        # Nothing is known to have been handled, so retry the whole batch
+        response['batchItemFailures'] = [
+            {'itemIdentifier': record['messageId']}
+            for record in event.get('Records', []) if 'messageId' in record
+        ]
+        return response
+    
+    finally:
+        # Write every audit entry from this invocation in one batch
+        if aws_service:
+            aws_service.flush_audit_logs()
+
 
+def handled_key(message_body: dict) -> tuple:
+    """Identity of a message for redelivery checks"""
+    return (message_body.get('comment_id'), message_body.get('action'))
 
-def process_escalation(aws_service: AWSService, secrets: dict, comment_id: str, 
-                      client_id: str, classification: dict) -> bool:
+
+def handle_message(aws_service: AWSService, now_iso: str, secrets: dict, message_body: dict,
+                   comments: dict, notification_configs: dict, slack_outbox: dict,
+                   slack_key: int) -> Tuple[bool, Optional[str], Optional[dict]]:
     """
-    Process escalation for a specific comment
+    Handle one SQS message; Slack attachments are queued under slack_key
+    Returns (processed, error message or None, escalation to record once Slack is sent)
     """
     
     try:
-        # Get comment details
-        comment = aws_service.get_comment(comment_id)
+        if message_body.get('action') == 'escalate':
+            comment_id = message_body['comment_id']
+            client_id = message_body['client_id']
+            classification = message_body.get('classification', {})
+            
+            logger.info(f"Processing escalation for comment: {comment_id}")
+            
+            # Process the escalation
+            success, escalation = process_escalation(
+                aws_service,
+                now_iso,
+                secrets,
+                comment_id,
+                client_id,
+                classification,
+                comments.get(comment_id),
+                notification_configs.get(client_id),
+                slack_outbox,
+                slack_key
+            )
+            
+            if not success:
+                return False, f"Failed to escalate comment {comment_id}", None
+            return True, None, escalation
+        
+        elif message_body.get('action') == 'send_notification':
+            # Handle other notification types (like hide notifications)
+            success = send_notification(aws_service, secrets, message_body, slack_outbox, slack_key)
+            if not success:
+                return False, f"Failed to send notification: {message_body.get('type', 'unknown')}", None
+            return True, None, None
+        
+        return False, None, None
+        
+    except Exception as e:
+        error_msg = f"Error processing record: {str(e)}"
+        logger.error(error_msg)
+        return False, error_msg, None
+
+
+def process_escalation(aws_service: AWSService, now_iso: str, secrets: dict, comment_id: str, 
+                      client_id: str, classification: dict, comment: Optional[dict],
+                      notification_config: Optional[dict], slack_outbox: dict,
+                      slack_key: int) -> Tuple[bool, Optional[dict]]:
+    """
+    Send the notifications for a specific comment
+    comment / notification_config are the batch-prefetched items (None to fetch here)
+    Returns (success, escalation for record_escalation or None if nothing to record)
+    """
+    
+    try:
+        # Get comment details, unless prefetched with the batch
+        if comment is None:
+            comment = aws_service.get_comment(comment_id)
         if not comment:
             logger.error(f"Comment not found: {comment_id}")
-            return False
+            return False, None
         
         # Check if already escalated
         if comment.get('escalated'):
             logger.info(f"Comment already escalated: {comment_id}")
-            return True
+            return True, None
         
         # Get client notification preferences
-        notification_config = aws_service.get_client_config(client_id, 'notifications')
+        if notification_config is None:
+            notification_config = aws_service.get_client_config(client_id, 'notifications')
         
         # Determine escalation urgency and channels
         escalation_level = determine_escalation_level(classification)
@@ -133,7 +325,9 @@ def process_escalation(aws_service: AWSService, secrets: dict, comment_id: str,
                 classification, 
                 client_id, 
                 escalation_level,
-                notification_config
+                notification_config,
+                slack_outbox,
+                slack_key
             )
             if slack_success:
                 notifications_sent.append('slack')
@@ -165,27 +359,14 @@ def process_escalation(aws_service: AWSService, secrets: dict, comment_id: str,
             if sms_success:
                 notifications_sent.append('sms')
         
-        # Update comment record
-        aws_service.update_comment(comment_id, {
-            'escalated': True,
-            'escalation_level': escalation_level,
-            'notifications_sent': notifications_sent,
-            'escalation_timestamp': datetime.now(timezone.utc).isoformat(),
-            'action_taken': 'escalated'
-        })
-        
-        # Log successful escalation
-        aws_service.save_audit_log('comment_escalated', {
+        # Recorded by record_escalation once the queued Slack message is sent
+        return True, {
             'comment_id': comment_id,
             'client_id': client_id,
-            'escalation_level': escalation_level,
-            'notifications_sent': notifications_sent,
             'classification': classification,
-            'timestamp': datetime.now(timezone.utc).isoformat()
-        })
-        
-        logger.info(f"Successfully escalated comment: {comment_id}")
-        return True
+            'escalation_level': escalation_level,
+            'notifications_sent': notifications_sent
+        }
         
     except Exception as e:
         logger.error(f"Failed to process escalation for {comment_id}: {e}")
@@ -194,39 +375,65 @@ def process_escalation(aws_service: AWSService, secrets: dict, comment_id: str,
         aws_service.update_comment(comment_id, {
             'escalation_failed': True,
             'escalation_error': str(e),
-            'escalation_timestamp': datetime.now(timezone.utc).isoformat()
+            'escalation_timestamp': now_iso
         })
         
-        return False
+        return False, None
 
 
-def determine_escalation_level(classification: dict) -> str:
+def record_escalation(aws_service: AWSService, now_iso: str, escalation: dict) -> bool:
     """
-    Determine escalation level based on classification
+    Mark a comment as escalated and audit it, after its notifications were sent
     """
     
+    comment_id = escalation['comment_id']
+    
     try:
-        urgency = classification.get('urgency', 'low')
-        toxicity_score = classification.get('toxicity_score', 0)
-        sentiment = classification.get('sentiment', 'neutral')
-        intent = classification.get('intent', 'general')
-        confidence = classification.get('confidence', 0)
+        # Update comment record; update_comment logs its own failures
+        if not aws_service.update_comment(comment_id, {
+            'escalated': True,
+            'escalation_level': escalation['escalation_level'],
+            'notifications_sent': escalation['notifications_sent'],
+            'escalation_timestamp': now_iso,
+            'action_taken': 'escalated'
+        }):
+            return False
         
-        # Critical: High toxicity + high confidence
-        if toxicity_score >= 8 and confidence >= 80:
-            return 'critical'
+        # Log successful escalation
+        aws_service.record_audit('comment_escalated', {
+            'comment_id': comment_id,
+            'client_id': escalation['client_id'],
+            'escalation_level': escalation['escalation_level'],
+            'notifications_sent': escalation['notifications_sent'],
+            **summarize_classification(escalation['classification']),
+            'timestamp': now_iso
+        }, idempotency_key=comment_id)
         
-        # Critical: Legal threats or severe complaints
-        if intent == 'complaint' and urgency == 'high':
-            return 'critical'
+        logger.info(f"Successfully escalated comment: {comment_id}")
+        return True
         
-        # High: Medium-high toxicity or urgent issues
-        if toxicity_score >= 6 or urgency == 'high':
-            return 'high'
+    except Exception as e:
+        logger.error(f"Failed to record escalation for {comment_id}: {e}")
+        return False
+
+
+def determine_escalation_level(classification: dict) -> str:
+    """
+    Determine escalation level based on classification
+    """
+    
+    try:
+        signals = {
+            'urgency': classification.get('urgency', 'low'),
+            'toxicity_score': classification.get('toxicity_score', 0),
+            'sentiment': classification.get('sentiment', 'neutral'),
+            'intent': classification.get('intent', 'general'),
+            'confidence': classification.get('confidence', 0)
+        }
         
-        # Medium: Questions, complaints, or moderate issues
-        if urgency == 'medium' or intent in ['question', 'complaint']:
-            return 'medium'
+        for matches, level in ESCALATION_RULES:
+            if matches(signals):
+                return level
         
         # Low: Everything else requiring human review
         return 'low'
@@ -237,9 +444,10 @@ def determine_escalation_level(classification: dict) -> str:
 
 
 def send_slack_notification(secrets: dict, comment: dict, classification: dict, 
-                           client_id: str, escalation_level: str, config: dict) -> bool:
+                           client_id: str, escalation_level: str, config: dict,
+                           slack_outbox: dict, slack_key: int) -> bool:
     """
-    Send notification to Slack
+    Queue a Slack notification; flush_slack_notifications sends the batch
     """
     
     try:
@@ -248,36 +456,54 @@ def send_slack_notification(secrets: dict, comment: dict, classification: dict,
             logger.warning("Slack webhook URL not configured")
             return False
         
-        # Build Slack message
-        message = build_slack_message(comment, classification, client_id, escalation_level, config)
+        # Build Slack attachment
+        attachment = build_slack_message(comment, classification, client_id, escalation_level, config)
+        slack_outbox.setdefault(webhook_url, []).append((slack_key, attachment))
         
-        # Send to Slack
-        response = requests.post(webhook_url, json=message, timeout=10)
-        response.raise_for_status()
-        
-        logger.info(f"Sent Slack notification for comment: {comment['comment_id']}")
+        logger.info(f"Queued Slack notification for comment: {comment['comment_id']}")
         return True
         
     except Exception as e:
-        logger.error(f"Failed to send Slack notification: {e}")
+        logger.error(f"Failed to queue Slack notification: {e}")
         return False
 
 
+def flush_slack_notifications(slack_outbox: dict) -> Tuple[list, set]:
+    """
+    Post queued attachments, one message per webhook (chunked at
+    MAX_ATTACHMENTS_PER_MSG). Returns (error messages for failed posts,
+    keys of the messages whose attachments were not delivered).
+    """
+    
+    errors = []
+    failed_keys = set()
+    
+    for webhook_url, queued in slack_outbox.items():
+        http = _get_http()
+        for start in range(0, len(queued), MAX_ATTACHMENTS_PER_MSG):
+            chunk = queued[start:start + MAX_ATTACHMENTS_PER_MSG]
+            try:
+                response = http.post(webhook_url, json={"attachments": [attachment for _, attachment in chunk]},
+                                     timeout=SLACK_TIMEOUT)
+                response.raise_for_status()
+                logger.info(f"Sent {len(chunk)} Slack notifications")
+            except Exception as e:
+                error_msg = f"Failed to send {len(chunk)} Slack notifications: {e}"
+                logger.error(error_msg)
+                errors.append(error_msg)
+                failed_keys.update(key for key, _ in chunk)
+    
+    return errors, failed_keys
+
+
 def build_slack_message(comment: dict, classification: dict, client_id: str, 
                        escalation_level: str, config: dict) -> dict:
     """
-    Build Slack message payload
+    Build the Slack attachment for one escalated comment
     """
     
     # Determine message color based on escalation level
-    colors = {
-        'critical': '#FF0000',  # Red
-        'high': '#FF6600',      # Orange
-        'medium': '#FFCC00',    # Yellow
-        'low': '#00CC00'        # Green
-    }
-    
-    color = colors.get(escalation_level, '#CCCCCC')
+    color = SLACK_LEVEL_COLORS.get(escalation_level, '#CCCCCC')
     
     # Build message blocks
     blocks = [
@@ -353,12 +579,8 @@ def build_slack_message(comment: dict, classification: dict, client_id: str,
     })
     
     return {
-        "attachments": [
-            {
-                "color": color,
-                "blocks": blocks
-            }
-        ]
+        "color": color,
+        "blocks": blocks
     }
 
 
@@ -402,7 +624,8 @@ def send_sms_notification(aws_service: AWSService, comment: dict, classification
         return False
 
 
-def send_notification(aws_service: AWSService, secrets: dict, notification_data: dict) -> bool:
+def send_notification(aws_service: AWSService, secrets: dict, notification_data: dict, slack_outbox: dict,
+                      slack_key: int) -> bool:
     """
     Send generic notification (for hide notifications, etc.)
     """
@@ -411,7 +634,7 @@ def send_notification(aws_service: AWSService, secrets: dict, notification_data:
         notification_type = notification_data.get('type')
         
         if notification_type == 'comment_hidden':
-            return send_hide_notification_slack(secrets, notification_data)
+            return send_hide_notification_slack(secrets, notification_data, slack_outbox, slack_key)
         
         # Add more notification types as needed
         
@@ -423,9 +646,9 @@ def send_notification(aws_service: AWSService, secrets: dict, notification_data:
         return False
 
 
-def send_hide_notification_slack(secrets: dict, notification_data: dict) -> bool:
+def send_hide_notification_slack(secrets: dict, notification_data: dict, slack_outbox: dict, slack_key: int) -> bool:
     """
-    Send Slack notification for hidden comments
+    Queue Slack notification for hidden comments
     """
     
     try:
@@ -433,40 +656,34 @@ def send_hide_notification_slack(secrets: dict, notification_data: dict) -> bool
         if not webhook_url or webhook_url == 'placeholder-for-now':
             return False
         
-        message = {
-            "text": f"🙈 Comment Hidden",
-            "attachments": [
+        attachment = {
+            "pretext": "🙈 Comment Hidden",
+            "color": "#FF6600",
+            "fields": [
+                {
+                    "title": "Client",
+                    "value": notification_data.get('client_id'),
+                    "short": True
+                },
                 {
-                    "color": "#FF6600",
-                    "fields": [
-                        {
-                            "title": "Client",
-                            "value": notification_data.get('client_id'),
-                            "short": True
-                        },
-                        {
-                            "title": "Reason",
-                            "value": notification_data.get('hide_reason'),
-                            "short": True
-                        },
-                        {
-                            "title": "Comment",
-                            "value": notification_data.get('comment_text', '')[:200],
-                            "short": False
-                        }
-                    ]
+                    "title": "Reason",
+                    "value": notification_data.get('hide_reason'),
+                    "short": True
+                },
+                {
+                    "title": "Comment",
+                    "value": notification_data.get('comment_text', '')[:200],
+                    "short": False
                 }
             ]
         }
+        slack_outbox.setdefault(webhook_url, []).append((slack_key, attachment))
         
-        response = requests.post(webhook_url, json=message, timeout=10)
-        response.raise_for_status()
-        
-        logger.info(f"Sent hide notification to Slack")
+        logger.info(f"Queued hide notification for Slack")
         return True
         
     except Exception as e:
-        logger.error(f"Failed to send hide notification to Slack: {e}")
+        logger.error(f"Failed to queue hide notification for Slack: {e}")
         return False
 
 
@@ -12,8 +12,54 @@ import os
 #sys.path.append('/opt/python')
 #sys.path.append(os.path.join(os.path.dirname(__file__), 'shared'))
 
-from shared.utils import AWSService, MetaAPIClient, lambda_response, validate_required_env_vars, logger
+from shared.utils import (AWSService, MetaAPIClient, TTLCache, audit_digest, compile_keyword_pattern, json_loads, lambda_response,
+                          summarize_classification, validate_required_env_vars, logger)
+from boto3.dynamodb.conditions import Attr
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
+from typing import Optional, Tuple
+import time
+
+
+# Services reused across warm invocations; secrets are re-read after
+# SECRETS_TTL_SECONDS so rotated values eventually propagate
+SECRETS_TTL_SECONDS = int(os.environ.get('SECRETS_TTL_SECONDS', '600'))
+_AWS_SERVICE = None
+_SECRETS = None
+_SECRETS_TS = 0.0
+_META_CLIENT = None
+
+# Messages in a batch are handled concurrently (bounded by the SQS batch size)
+MAX_WORKERS = 10
+
+# (comment_id, action) pairs this container handled successfully; SQS
+# redeliveries of them are dropped instead of repeating the work
+_RECENTLY_HANDLED = TTLCache(maxsize=1024, ttl_seconds=900)
+
+
+def _get_services():
+    """Return the cached AWSService, secrets and MetaAPIClient, initializing them on first use"""
+    global _AWS_SERVICE, _SECRETS, _SECRETS_TS, _META_CLIENT
+    
+    if _AWS_SERVICE is None:
+        _AWS_SERVICE = AWSService()
+    
+    if _SECRETS is None or time.monotonic() - _SECRETS_TS > SECRETS_TTL_SECONDS:
+        secrets = _AWS_SERVICE.get_secrets()
+        if _META_CLIENT is None or secrets.get('meta_access_token') != _SECRETS.get('meta_access_token'):
+            _META_CLIENT = MetaAPIClient(secrets['meta_access_token'])
+        _SECRETS = secrets
+        _SECRETS_TS = time.monotonic()
+    
+    return _AWS_SERVICE, _SECRETS, _META_CLIENT
+
+
+# Initialize during the Lambda init phase; a failure here (e.g. a Secrets Manager
+# blip) is retried on the first invocation instead of poisoning the container
+try:
+    _get_services()
+except Exception as e:
+    logger.warning(f"Deferred service initialization to first invocation: {e}")
 
 
 def lambda_handler(event, context):
@@ -28,52 +74,74 @@ def lambda_handler(event, context):
     if not validate_required_env_vars(required_vars):
         return lambda_response(500, {'error': 'Missing required environment variables'})
     
+    aws_service = None
+    
+    # One timestamp for every record written by this invocation
+    now_iso = datetime.now(timezone.utc).isoformat()
+    
     try:
-        # Initialize services
-        aws_service = AWSService()
-        secrets = aws_service.get_secrets()
-        
-        # Initialize Meta API client
-        meta_client = MetaAPIClient(secrets['meta_access_token'])
+        # Reuse services initialized on a previous invocation
+        aws_service, secrets, meta_client = _get_services()
         
         processed_count = 0
         errors = []
         
-        # Process each SQS record
+        # Parse SQS messages
+        messages = []
         for record in event.get('Records', []):
             try:
-                # Parse SQS message
-                message_body = json.loads(record['body'])
-                
-                if message_body.get('action') == 'hide':
-                    comment_id = message_body['comment_id']
-                    client_id = message_body['client_id']
-                    classification = message_body.get('classification', {})
-                    
-                    logger.info(f"Processing hide for comment: {comment_id}")
-                    
-                    # Process the hide action
-                    success = process_hide(
-                        aws_service,
-                        meta_client,
-                        comment_id,
-                        client_id,
-                        classification
-                    )
-                    
-                    if success:
-                        processed_count += 1
-                    else:
-                        errors.append(f"Failed to hide comment {comment_id}")
-                
+                messages.append(json_loads(record['body']))
             except Exception as e:
-                error_msg = f"Error processing record: {str(e)}"
+                error_msg = f"Error parsing record: {str(e)}"
                 logger.error(error_msg)
                 errors.append(error_msg)
         
+        # Drop redelivered messages this container already handled
+        duplicates = [m for m in messages if _RECENTLY_HANDLED.get(handled_key(m))]
+        if duplicates:
+            logger.info(f"Skipping {len(duplicates)} already handled messages")
+            messages = [m for m in messages if not _RECENTLY_HANDLED.get(handled_key(m))]
+        
+        # Fetch the batch's client configs up front; moderation rules and
+        # notification preferences come back in one BatchGetItem
+        targets = [m for m in messages if m.get('action') == 'hide' and 'comment_id' in m and 'client_id' in m]
+        client_configs = aws_service.batch_get_client_config_types(
+            [m['client_id'] for m in targets], ['moderation_rules', 'notifications']
+        )
+        
+        # Comments are only read when the hide decision depends on them
+        comments = aws_service.batch_get_comments([
+            m['comment_id'] for m in targets
+            if needs_comment(m.get('classification', {}), client_configs[(m['client_id'], 'moderation_rules')])
+        ])
+        
+        # Hide notifications queued by this batch, sent with SendMessageBatch
+        pending_messages = []
+        
+        # Messages target different comments, so their I/O can overlap
+        results = []
+        if messages:
+            with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(messages))) as executor:
+                results = list(executor.map(
+                    lambda message_body: handle_message(aws_service, now_iso, meta_client, message_body, comments, client_configs,
+                                                        pending_messages),
+                    messages
+                ))
+        
+        for message_body, (processed, error) in zip(messages, results):
+            if processed:
+                processed_count += 1
+                _RECENTLY_HANDLED.set(handled_key(message_body), True)
+            if error:
+                errors.append(error)
+        
+        for index in aws_service.send_messages_batch(pending_messages):
+            message = pending_messages[index]['message']
+            errors.append(f"Failed to queue hide notification for comment {message['comment_id']}")
+        
         # Log audit information
-        aws_service.save_audit_log('hide_batch_completed', {
-            'timestamp': datetime.now(timezone.utc).isoformat(),
+        aws_service.record_audit('hide_batch_completed', {
+            'timestamp': now_iso,
             'records_received': len(event.get('Records', [])),
             'comments_hidden': processed_count,
             'errors': errors
@@ -90,17 +158,82 @@ def lambda_handler(event, context):
     except Exception as e:
         logger.error(f"Hide handler failed: {str(e)}")
         return lambda_response(500, {'status': 'error', 'message': str(e)})
+    
+    finally:
+        # Write every audit entry from this invocation in one batch
+        if aws_service:
+            aws_service.flush_audit_logs()
+
+
+def handled_key(message_body: dict) -> tuple:
+    """Identity of a message for redelivery checks"""
+    return (message_body.get('comment_id'), message_body.get('action'))
 
 
-def process_hide(aws_service: AWSService, meta_client: MetaAPIClient,
-                comment_id: str, client_id: str, classification: dict) -> bool:
+def handle_message(aws_service: AWSService, now_iso: str, meta_client: MetaAPIClient,
+                   message_body: dict, comments: dict, client_configs: dict,
+                   pending_messages: list) -> Tuple[bool, Optional[str]]:
+    """
+    Handle one SQS message
+    Returns (processed, error message or None)
+    """
+    
+    try:
+        if message_body.get('action') == 'hide':
+            comment_id = message_body['comment_id']
+            client_id = message_body['client_id']
+            classification = message_body.get('classification', {})
+            
+            logger.info(f"Processing hide for comment: {comment_id}")
+            
+            # Process the hide action
+            success = process_hide(
+                aws_service,
+                now_iso,
+                meta_client,
+                comment_id,
+                client_id,
+                classification,
+                comments.get(comment_id),
+                client_configs.get((client_id, 'moderation_rules')),
+                client_configs.get((client_id, 'notifications')),
+                pending_messages
+            )
+            
+            if not success:
+                return False, f"Failed to hide comment {comment_id}"
+            return True, None
+        
+        return False, None
+        
+    except Exception as e:
+        error_msg = f"Error processing record: {str(e)}"
+        logger.error(error_msg)
+        return False, error_msg
+
+
+def process_hide(aws_service: AWSService, now_iso: str, meta_client: MetaAPIClient,
+                comment_id: str, client_id: str, classification: dict,
+                comment: Optional[dict], client_config: Optional[dict],
+                notification_config: Optional[dict], pending_messages: list) -> bool:
     """
     Process hiding a specific comment
+    comment / client_config / notification_config are the batch-prefetched items (None to fetch here)
     """
     
     try:
-        # Get comment details
-        comment = aws_service.get_comment(comment_id)
+        # Get client configuration for hiding rules
+        if client_config is None:
+            client_config = aws_service.get_client_config(client_id, 'moderation_rules')
+        
+        # Decided on the classification alone; no need to read the comment
+        if not needs_comment(classification, client_config):
+            record_no_action(aws_service, comment_id, now_iso)
+            return True
+        
+        # Get comment details, unless prefetched with the batch
+        if comment is None:
+            comment = aws_service.get_comment(comment_id)
         if not comment:
             logger.error(f"Comment not found: {comment_id}")
             return False
@@ -110,46 +243,40 @@ def process_hide(aws_service: AWSService, meta_client: MetaAPIClient,
             logger.info(f"Comment already hidden: {comment_id}")
             return True
         
-        # Get client configuration for hiding rules
-        client_config = aws_service.get_client_config(client_id, 'moderation_rules')
-        
         # Verify hide criteria
         should_hide = verify_hide_criteria(comment, classification, client_config)
         
         if not should_hide:
-            logger.info(f"Comment does not meet hide criteria: {comment_id}")
-            # Update status but don't hide
-            aws_service.update_comment(comment_id, {
-                'hide_reviewed': True,
-                'hide_decision': 'no_action',
-                'hide_timestamp': datetime.now(timezone.utc).isoformat()
-            })
+            record_no_action(aws_service, comment_id, now_iso)
             return True
         
         # Hide comment via Meta API
         hide_success = meta_client.hide_comment(comment_id)
         
         if hide_success:
+            hide_reason = get_hide_reason(classification)
+            
             # Update comment record
             aws_service.update_comment(comment_id, {
                 'hidden': True,
-                'hide_reason': get_hide_reason(classification),
-                'hide_timestamp': datetime.now(timezone.utc).isoformat(),
+                'hide_reason': hide_reason,
+                'hide_timestamp': now_iso,
                 'action_taken': 'hidden'
             })
             
             # Log successful hide
-            aws_service.save_audit_log('comment_hidden', {
+            aws_service.record_audit('comment_hidden', {
                 'comment_id': comment_id,
                 'client_id': client_id,
-                'hide_reason': get_hide_reason(classification),
-                'classification': classification,
-                'comment_text': comment.get('text', '')[:100],  # First 100 chars for audit
-                'timestamp': datetime.now(timezone.utc).isoformat()
-            })
+                'hide_reason': hide_reason,
+                **summarize_classification(classification),
+                'comment_text_sha': audit_digest(comment.get('text', '')),
+                'timestamp': now_iso
+            }, idempotency_key=comment_id)
             
             # Send notification if configured
-            send_hide_notification(aws_service, comment, classification, client_id)
+            send_hide_notification(aws_service, comment, classification, client_id, hide_reason,
+                                   notification_config, now_iso, pending_messages)
             
             logger.info(f"Successfully hidden comment: {comment_id}")
             return True
@@ -160,7 +287,7 @@ def process_hide(aws_service: AWSService, meta_client: MetaAPIClient,
             aws_service.update_comment(comment_id, {
                 'hide_failed': True,
                 'hide_error': 'API call failed',
-                'hide_timestamp': datetime.now(timezone.utc).isoformat()
+                'hide_timestamp': now_iso
             })
             
             return False
@@ -172,12 +299,31 @@ def process_hide(aws_service: AWSService, meta_client: MetaAPIClient,
         aws_service.update_comment(comment_id, {
             'hide_failed': True,
             'hide_error': str(e),
-            'hide_timestamp': datetime.now(timezone.utc).isoformat()
+            'hide_timestamp': now_iso
         })
         
         return False
 
 
+def record_no_action(aws_service: AWSService, comment_id: str, now_iso: str):
+    """Mark a comment as reviewed without hiding it, unless it is already hidden"""
+    logger.info(f"Comment does not meet hide criteria: {comment_id}")
+    # The comment is not read first, so the condition keeps an earlier hide intact
+    aws_service.update_comment(comment_id, {
+        'hide_reviewed': True,
+        'hide_decision': 'no_action',
+        'hide_timestamp': now_iso
+    }, condition=Attr('hidden').not_exists() | Attr('hidden').eq(False))
+
+
+def needs_comment(classification: dict, client_config: dict) -> bool:
+    """
+    Whether processing a hide needs the stored comment: banned keywords are
+    matched against its text, and a hide first checks it is not already hidden
+    """
+    return bool(client_config.get('banned_keywords')) or verify_hide_criteria({}, classification, client_config)
+
+
 def verify_hide_criteria(comment: dict, classification: dict, client_config: dict) -> bool:
     """
     Verify if comment meets criteria for hiding
@@ -189,13 +335,12 @@ def verify_hide_criteria(comment: dict, classification: dict, client_config: dic
         if classification.get('toxicity_score', 0) >= toxicity_threshold:
             return True
         
-        # Check for banned keywords
-        banned_keywords = client_config.get('banned_keywords', [])
-        comment_text = comment.get('text', '').lower()
-        
-        for keyword in banned_keywords:
-            if keyword.lower() in comment_text:
-                logger.info(f"Comment contains banned keyword: {keyword}")
+        # Check for banned keywords (one compiled alternation, cached by keyword list)
+        banned_pattern = compile_keyword_pattern(tuple(client_config.get('banned_keywords', [])))
+        if banned_pattern:
+            match = banned_pattern.search(comment.get('text', '').lower())
+            if match:
+                logger.info(f"Comment contains banned keyword: {match.group(0)}")
                 return True
         
         # Check for spam patterns
@@ -210,7 +355,7 @@ def verify_hide_criteria(comment: dict, classification: dict, client_config: dic
         
         # Check for specific violation types
         violation_types = client_config.get('auto_hide_violations', [])
-        if any(violation in get_violation_types(classification) for violation in violation_types):
+        if violation_types and not get_violation_types(classification).isdisjoint(violation_types):
             return True
         
         return False
@@ -269,40 +414,43 @@ def is_repeat_offender(comment: dict, client_config: dict) -> bool:
         return False
 
 
-def get_violation_types(classification: dict) -> list:
+def get_violation_types(classification: dict) -> set:
     """
     Extract violation types from classification
     """
     
     try:
-        violations = []
+        violations = set()
         
         if classification.get('toxicity_score', 0) >= 7:
-            violations.append('toxicity')
+            violations.add('toxicity')
         
         if classification.get('intent') == 'spam':
-            violations.append('spam')
+            violations.add('spam')
         
         if classification.get('sentiment') == 'negative' and classification.get('urgency') == 'high':
-            violations.append('harassment')
+            violations.add('harassment')
         
         # Add more violation detection logic here
         
         return violations
         
     except Exception:
-        return []
+        return set()
 
 
 def send_hide_notification(aws_service: AWSService, comment: dict, 
-                          classification: dict, client_id: str):
+                          classification: dict, client_id: str, hide_reason: str,
+                          notification_config: Optional[dict], now_iso: str, pending_messages: list):
     """
-    Send notification about hidden comment to client team
+    Queue notification about hidden comment to client team
+    The message is added to pending_messages and sent by the handler in one batch
     """
     
     try:
-        # Get notification preferences
-        notification_config = aws_service.get_client_config(client_id, 'notifications')
+        # Get notification preferences, unless prefetched with the batch
+        if notification_config is None:
+            notification_config = aws_service.get_client_config(client_id, 'notifications')
         
         if not notification_config.get('hide_notifications_enabled', True):
             return
@@ -314,18 +462,18 @@ def send_hide_notification(aws_service: AWSService, comment: dict,
             'comment_id': comment['comment_id'],
             'client_id': client_id,
             'comment_text': comment.get('text', '')[:200],  # First 200 chars
-            'hide_reason': get_hide_reason(classification),
+            'hide_reason': hide_reason,
             'toxicity_score': classification.get('toxicity_score', 0),
-            'timestamp': datetime.now(timezone.utc).isoformat()
+            'timestamp': now_iso
         }
         
-        # Send to escalation queue for notification
-        aws_service.send_to_queue(notification_data)
+        # Queue for the escalation handler to notify
+        pending_messages.append({'message': notification_data})
         
-        logger.info(f"Sent hide notification for comment: {comment['comment_id']}")
+        logger.info(f"Queued hide notification for comment: {comment['comment_id']}")
         
     except Exception as e:
-        logger.error(f"Failed to send hide notification: {e}")
+        logger.error(f"Failed to queue hide notification: {e}")
 
 
 # For local testing
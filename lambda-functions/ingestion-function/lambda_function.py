@@ -12,9 +12,52 @@ import os
 #sys.path.append('/opt/python')
 #sys.path.append(os.path.join(os.path.dirname(__file__), 'shared'))
 
-from shared.utils import AWSService, MetaAPIClient, lambda_response, validate_required_env_vars, logger
+from shared.utils import AWSService, MetaAPIClient, lambda_response, utc_sort_key, validate_required_env_vars, logger
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timezone, timedelta
+from boto3.dynamodb.conditions import Key
 import uuid
+import time
+
+
+# Services reused across warm invocations; secrets are re-read after
+# SECRETS_TTL_SECONDS so rotated values eventually propagate
+SECRETS_TTL_SECONDS = int(os.environ.get('SECRETS_TTL_SECONDS', '600'))
+_AWS_SERVICE = None
+_SECRETS = None
+_SECRETS_TS = 0.0
+_META_CLIENT = None
+
+# Config table GSI keyed by (config_type, client_id)
+CONFIG_TYPE_INDEX = 'ConfigTypeIndex'
+
+# Clients ingested concurrently
+MAX_WORKERS = 16
+
+
+def _get_services():
+    """Return the cached AWSService and MetaAPIClient, initializing them on first use"""
+    global _AWS_SERVICE, _SECRETS, _SECRETS_TS, _META_CLIENT
+    
+    if _AWS_SERVICE is None:
+        _AWS_SERVICE = AWSService()
+    
+    if _SECRETS is None or time.monotonic() - _SECRETS_TS > SECRETS_TTL_SECONDS:
+        secrets = _AWS_SERVICE.get_secrets()
+        if _META_CLIENT is None or secrets.get('meta_access_token') != _SECRETS.get('meta_access_token'):
+            _META_CLIENT = MetaAPIClient(secrets['meta_access_token'])
+        _SECRETS = secrets
+        _SECRETS_TS = time.monotonic()
+    
+    return _AWS_SERVICE, _META_CLIENT
+
+
+# Initialize during the Lambda init phase; a failure here (e.g. a Secrets Manager
+# blip) is retried on the first invocation instead of poisoning the container
+try:
+    _get_services()
+except Exception as e:
+    logger.warning(f"Deferred service initialization to first invocation: {e}")
 
 
 def lambda_handler(event, context):
@@ -30,13 +73,14 @@ def lambda_handler(event, context):
     if not validate_required_env_vars(required_vars):
         return lambda_response(500, {'error': 'Missing required environment variables'})
     
+    aws_service = None
+    
+    # One timestamp per run; it also becomes each client's next ingestion watermark
+    now_iso = datetime.now(timezone.utc).isoformat()
+    
     try:
-        # Initialize services
-        aws_service = AWSService()
-        secrets = aws_service.get_secrets()
-        
-        # Initialize Meta API client
-        meta_client = MetaAPIClient(secrets['meta_access_token'])
+        # Reuse services initialized on a previous invocation
+        aws_service, meta_client = _get_services()
         
         # Get active clients from config
         active_clients = get_active_clients(aws_service)
@@ -44,39 +88,47 @@ def lambda_handler(event, context):
         total_processed = 0
         total_new_comments = 0
         
-        # Process each client
-        for client in active_clients:
-            client_id = client['client_id']
-            client_config = client['config']
-            
-            logger.info(f"Processing client: {client_id}")
-            
-            # Fetch comments for this client
-            new_comments = fetch_client_comments(
-                meta_client, 
-                aws_service, 
-                client_id, 
-                client_config
-            )
-            
-            total_new_comments += len(new_comments)
-            
-            # Send new comments to processing queue
-            logger.info(f"DEBUG: About to queue {len(new_comments)} comments")
-            for comment in new_comments:
-                logger.info(f"DEBUG: Queuing comment {comment['comment_id']}")
-                success = aws_service.send_to_queue({
-                    'action': 'classify_comment',
-                    'comment_id': comment['comment_id'],
-                    'client_id': client_id
-                })
-                logger.info(f"DEBUG: Queue result: {success}")
-                if success:
-                    total_processed += 1
+        # classify_comment messages for every new comment in this run
+        pending_messages = []
+        
+        # Clients are independent, so their Meta API and DynamoDB I/O can overlap
+        if active_clients:
+            with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(active_clients))) as executor:
+                futures = {}
+                for client in active_clients:
+                    logger.info(f"Processing client: {client['client_id']}")
+                    
+                    # Fetch comments for this client
+                    future = executor.submit(
+                        fetch_client_comments,
+                        meta_client, 
+                        aws_service, 
+                        client['client_id'], 
+                        client['config'],
+                        now_iso
+                    )
+                    futures[future] = client['client_id']
+                
+                for future in as_completed(futures):
+                    client_id = futures[future]
+                    new_comments = future.result()
+                    
+                    total_new_comments += len(new_comments)
+                    
+                    for comment in new_comments:
+                        pending_messages.append({'message': {
+                            'action': 'classify_comment',
+                            'comment_id': comment['comment_id'],
+                            'client_id': client_id
+                        }})
+        
+        # Send new comments to processing queue, 10 per SendMessageBatch
+        failed = aws_service.send_messages_batch(pending_messages)
+        total_processed = len(pending_messages) - len(failed)
         
         # Log audit information
         aws_service.save_audit_log('ingestion_completed', {
-            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'timestamp': now_iso,
             'clients_processed': len(active_clients),
             'new_comments_found': total_new_comments,
             'comments_queued': total_processed,
@@ -95,11 +147,12 @@ def lambda_handler(event, context):
     except Exception as e:
         logger.error(f"Ingestion failed: {str(e)}")
         
-        # Log error for monitoring
-        aws_service.save_audit_log('ingestion_error', {
-            'error': str(e),
-            'timestamp': datetime.now(timezone.utc).isoformat()
-        })
+        # Log error for monitoring (not possible if the services failed to initialize)
+        if aws_service:
+            aws_service.save_audit_log('ingestion_error', {
+                'error': str(e),
+                'timestamp': now_iso
+            })
         
         return lambda_response(500, {
             'status': 'error',
@@ -113,25 +166,32 @@ def get_active_clients(aws_service: AWSService) -> list:
     Returns clients with Meta API configurations
     """
     try:
-        table = aws_service.dynamodb.Table(aws_service.config_table)
-        
-        # Scan for all client configurations of type 'meta_api'
-        response = table.scan(
-            FilterExpression='config_type = :config_type',
-            ExpressionAttributeValues={':config_type': 'meta_api'}
-        )
+        table = aws_service.get_table(aws_service.config_table)
         
         active_clients = []
-        
-        for item in response.get('Items', []):
-            config = item.get('config', {})
+        query_kwargs = {
+            'IndexName': CONFIG_TYPE_INDEX,
+            'KeyConditionExpression': Key('config_type').eq('meta_api'),
+            'ProjectionExpression': 'client_id, config'
+        }
+        
+        # Query the 'meta_api' configs through the GSI instead of scanning every row
+        while True:
+            response = table.query(**query_kwargs)
             
-            # Check if client has required Meta API configuration
-            if (config.get('page_id') or config.get('ad_account_id')) and config.get('enabled', True):
-                active_clients.append({
-                    'client_id': item['client_id'],
-                    'config': config
-                })
+            for item in response.get('Items', []):
+                config = item.get('config', {})
+                
+                # Check if client has required Meta API configuration
+                if (config.get('page_id') or config.get('ad_account_id')) and config.get('enabled', True):
+                    active_clients.append({
+                        'client_id': item['client_id'],
+                        'config': config
+                    })
+            
+            if 'LastEvaluatedKey' not in response:
+                break
+            query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
         
         logger.info(f"Found {len(active_clients)} active clients")
         return active_clients
@@ -142,7 +202,7 @@ def get_active_clients(aws_service: AWSService) -> list:
 
 
 def fetch_client_comments(meta_client: MetaAPIClient, aws_service: AWSService, 
-                         client_id: str, client_config: dict) -> list:
+                         client_id: str, client_config: dict, now_iso: str) -> list:
     """
     Fetch new comments for a specific client
     Returns list of new comments that weren't processed before
@@ -184,32 +244,41 @@ def fetch_client_comments(meta_client: MetaAPIClient, aws_service: AWSService,
             )
             all_comments.extend(instagram_comments)
         
+        # Skip comments already stored, checked with one batched key lookup
+        existing_ids = aws_service.get_existing_comment_ids([comment['comment_id'] for comment in all_comments])
+        
         # Process and deduplicate comments
+        standardized_comments = {}
         for comment in all_comments:
-            if is_new_comment(aws_service, comment['comment_id']):
-                
-                # Standardize comment format
-                standardized_comment = {
-                    'comment_id': comment['comment_id'],
-                    'client_id': client_id,
-                    'platform': comment.get('platform', 'facebook'),
-                    'post_id': comment.get('post_id', ''),
-                    'text': comment.get('text', comment.get('message', '')),
-                    'author_id': comment.get('from', {}).get('id', ''),
-                    'author_name': comment.get('from', {}).get('name', ''),
-                    'created_time': comment.get('created_time', ''),
-                    'like_count': comment.get('like_count', 0),
-                    'reply_count': comment.get('comment_count', 0),
-                    'raw_data': comment  # Store original data for reference
-                }
-                
-                # Save to database
-                if aws_service.save_comment(standardized_comment):
-                    new_comments.append(standardized_comment)
-                    logger.info(f"Saved new comment: {comment['comment_id']}")
+            if comment['comment_id'] in existing_ids or comment['comment_id'] in standardized_comments:
+                continue
+            
+            # Standardize comment format
+            standardized_comments[comment['comment_id']] = {
+                'comment_id': comment['comment_id'],
+                'client_id': client_id,
+                'platform': comment.get('platform', 'facebook'),
+                'post_id': comment.get('post_id', ''),
+                'text': comment.get('text', comment.get('message', '')),
+                # Instagram comments arrive pre-standardized with author fields
+                'author_id': comment.get('from', {}).get('id', comment.get('author_id', '')),
+                'author_name': comment.get('from', {}).get('name', comment.get('author_username', '')),
+                'created_time': comment.get('created_time', ''),
+                'like_count': comment.get('like_count', 0),
+                'reply_count': comment.get('comment_count', 0)
+            }
         
-        # Update last ingestion time
-        update_last_ingestion_time(aws_service, client_id)
+        # Save with conditional puts, so a comment stored earlier (even one the
+        # lookup above missed) is neither overwritten nor queued again
+        new_comments, complete = aws_service.save_comments_batch(list(standardized_comments.values()))
+        logger.info(f"Saved {len(new_comments)} new comments for client {client_id}")
+        
+        # Only move the watermark once every comment is stored, so failed writes
+        # are fetched again next run; the comments written now are queued either way
+        if complete:
+            update_last_ingestion_time(aws_service, client_id, now_iso)
+        else:
+            logger.warning(f"Keeping last ingestion time for client {client_id}: some comments were not saved")
         
         return new_comments
         
@@ -221,7 +290,8 @@ def fetch_client_comments(meta_client: MetaAPIClient, aws_service: AWSService,
 def fetch_page_comments(meta_client: MetaAPIClient, page_id: str, since_time: datetime) -> list:
     """Fetch comments from Facebook page posts"""
     try:
-        posts = meta_client.get_page_posts(page_id, limit=10)
+        # Comments are filtered by since_time on the Graph API side
+        posts = meta_client.get_page_posts_with_comments(page_id, since_time, limit=10)
         comments = []
         
         for post in posts:
@@ -231,11 +301,7 @@ def fetch_page_comments(meta_client: MetaAPIClient, page_id: str, since_time: da
                 # Add platform and post context
                 comment['platform'] = 'facebook'
                 comment['post_id'] = post['id']
-                
-                # Filter by time if specified
-                comment_time = datetime.fromisoformat(comment['created_time'].replace('Z', '+00:00'))
-                if comment_time > since_time:
-                    comments.append(comment)
+                comments.append(comment)
         
         logger.info(f"Fetched {len(comments)} page comments")
         return comments
@@ -253,13 +319,13 @@ def fetch_ad_comments(meta_client: MetaAPIClient, ad_account_id: str, since_time
         ad_comments = meta_client.get_ad_comments(ad_account_id)
         
         filtered_comments = []
+        since_key = utc_sort_key(since_time)
         for comment in ad_comments:
             comment['platform'] = 'facebook_ads'
             
             # Filter by time if comment has timestamp
             if comment.get('created_time'):
-                comment_time = datetime.fromisoformat(comment['created_time'].replace('Z', '+00:00'))
-                if comment_time > since_time:
+                if comment['created_time'][:19] > since_key:
                     filtered_comments.append(comment)
             else:
                 # Include comments without timestamp for now
@@ -289,20 +355,10 @@ def fetch_instagram_comments(meta_client: MetaAPIClient, instagram_account_id: s
         return []
 
 
-def is_new_comment(aws_service: AWSService, comment_id: str) -> bool:
-    """Check if comment already exists in database"""
-    try:
-        existing_comment = aws_service.get_comment(comment_id)
-        return existing_comment is None
-    except Exception as e:
-        logger.error(f"Failed to check comment existence: {e}")
-        return True  # Assume new to avoid missing comments
-
-
 def get_last_ingestion_time(aws_service: AWSService, client_id: str) -> datetime:
     """Get the last successful ingestion time for a client"""
     try:
-        config = aws_service.get_client_config(client_id, 'ingestion_state')
+        config = aws_service.get_client_config(client_id, 'ingestion_state', use_cache=False)
         
         if config and config.get('last_ingestion_time'):
             return datetime.fromisoformat(config['last_ingestion_time'])
@@ -315,17 +371,17 @@ def get_last_ingestion_time(aws_service: AWSService, client_id: str) -> datetime
         return datetime.now(timezone.utc) - timedelta(hours=1)
 
 
-def update_last_ingestion_time(aws_service: AWSService, client_id: str):
+def update_last_ingestion_time(aws_service: AWSService, client_id: str, now_iso: str):
     """Update the last successful ingestion time"""
     try:
-        table = aws_service.dynamodb.Table(aws_service.config_table)
+        table = aws_service.get_table(aws_service.config_table)
         
         table.put_item(Item={
             'client_id': client_id,
             'config_type': 'ingestion_state',
             'config': {
-                'last_ingestion_time': datetime.now(timezone.utc).isoformat(),
-                'last_update': datetime.now(timezone.utc).isoformat()
+                'last_ingestion_time': now_iso,
+                'last_update': now_iso
             }
         })
         
@@ -12,9 +12,67 @@ import os
 #sys.path.append('/opt/python')
 #sys.path.append(os.path.join(os.path.dirname(__file__), 'shared'))
 
-from shared.utils import AWSService, MetaAPIClient, lambda_response, validate_required_env_vars, logger
+from shared.utils import AWSService, MetaAPIClient, json_loads, lambda_response, validate_required_env_vars, logger
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
+from typing import Optional, Tuple
 import re
+import time
+
+
+# Services reused across warm invocations; secrets are re-read after
+# SECRETS_TTL_SECONDS so rotated values eventually propagate
+SECRETS_TTL_SECONDS = int(os.environ.get('SECRETS_TTL_SECONDS', '600'))
+_AWS_SERVICE = None
+_SECRETS = None
+_SECRETS_TS = 0.0
+_META_CLIENT = None
+
+# Messages in a batch are handled concurrently (bounded by the SQS batch size)
+MAX_WORKERS = 10
+
+# Classification fields tried in order when picking a reply template
+TEMPLATE_MATCH_ORDER = (('intent', 'general'), ('sentiment', 'neutral'), ('urgency', 'low'))
+DEFAULT_TEMPLATE = "Thank you for your comment! We appreciate your feedback and will respond soon."
+
+# Template placeholders such as {name}
+PLACEHOLDER_PATTERN = re.compile(r'\{([^}]+)\}')
+
+# Emoji appended to replies, by keyword group in priority order
+EMOJI_GROUPS = [
+    (('thank', 'appreciate', 'great'), " 😊"),
+    (('sorry', 'apologize', 'issue'), " 🙏"),
+    (('help', 'support', 'assist'), " 🤝")
+]
+EMOJI_KEYWORDS = {keyword: (priority, emoji)
+                  for priority, (keywords, emoji) in enumerate(EMOJI_GROUPS)
+                  for keyword in keywords}
+EMOJI_PATTERN = re.compile('|'.join(EMOJI_KEYWORDS), re.IGNORECASE)
+
+
+def _get_services():
+    """Return the cached AWSService and MetaAPIClient, initializing them on first use"""
+    global _AWS_SERVICE, _SECRETS, _SECRETS_TS, _META_CLIENT
+    
+    if _AWS_SERVICE is None:
+        _AWS_SERVICE = AWSService()
+    
+    if _SECRETS is None or time.monotonic() - _SECRETS_TS > SECRETS_TTL_SECONDS:
+        secrets = _AWS_SERVICE.get_secrets()
+        if _META_CLIENT is None or secrets.get('meta_access_token') != _SECRETS.get('meta_access_token'):
+            _META_CLIENT = MetaAPIClient(secrets['meta_access_token'])
+        _SECRETS = secrets
+        _SECRETS_TS = time.monotonic()
+    
+    return _AWS_SERVICE, _META_CLIENT
+
+
+# Initialize during the Lambda init phase; a failure here (e.g. a Secrets Manager
+# blip) is retried on the first invocation instead of poisoning the container
+try:
+    _get_services()
+except Exception as e:
+    logger.warning(f"Deferred service initialization to first invocation: {e}")
 
 
 def lambda_handler(event, context):
@@ -29,55 +87,50 @@ def lambda_handler(event, context):
     if not validate_required_env_vars(required_vars):
         return lambda_response(500, {'error': 'Missing required environment variables'})
     
+    # One timestamp for every write describing this invocation
+    now_iso = datetime.now(timezone.utc).isoformat()
+    aws_service = None
+    
     try:
-        # Initialize services
-        aws_service = AWSService()
-        secrets = aws_service.get_secrets()
-        
-        # Initialize Meta API client
-        meta_client = MetaAPIClient(secrets['meta_access_token'])
+        # Reuse services initialized on a previous invocation
+        aws_service, meta_client = _get_services()
         
         processed_count = 0
         errors = []
         
-        # Process each SQS record
+        # Parse SQS messages, keeping each messageId for partial batch failures
+        messages = []
+        message_ids = []
+        batch_item_failures = []
         for record in event.get('Records', []):
             try:
-                # Parse SQS message
-                message_body = json.loads(record['body'])
-
-                # DEBUG: Log what we received
-                logger.info(f"Reply handler received message: {message_body}")
-                
-                if message_body.get('action') == 'reply':
-                    comment_id = message_body['comment_id']
-                    client_id = message_body['client_id']
-                    classification = message_body.get('classification', {})
-                    
-                    logger.info(f"Processing reply for comment: {comment_id}")
-                    
-                    # Process the reply
-                    success = process_reply(
-                        aws_service,
-                        meta_client,
-                        comment_id,
-                        client_id,
-                        classification
-                    )
-                    
-                    if success:
-                        processed_count += 1
-                    else:
-                        errors.append(f"Failed to reply to comment {comment_id}")
-                
+                messages.append(json_loads(record['body']))
+                message_ids.append(record['messageId'])
             except Exception as e:
-                error_msg = f"Error processing record: {str(e)}"
+                error_msg = f"Error parsing record: {str(e)}"
                 logger.error(error_msg)
                 errors.append(error_msg)
         
+        # Messages target different comments, so their I/O can overlap
+        results = []
+        if messages:
+            with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(messages))) as executor:
+                results = list(executor.map(
+                    lambda message_body: handle_message(aws_service, now_iso, meta_client, message_body),
+                    messages
+                ))
+        
+        for message_id, (processed, error) in zip(message_ids, results):
+            if processed:
+                processed_count += 1
+            if error:
+                errors.append(error)
+                # Let SQS redeliver only the messages that failed
+                batch_item_failures.append({'itemIdentifier': message_id})
+        
         # Log audit information
-        aws_service.save_audit_log('reply_batch_completed', {
-            'timestamp': datetime.now(timezone.utc).isoformat(),
+        aws_service.record_audit('reply_batch_completed', {
+            'timestamp': now_iso,
             'records_received': len(event.get('Records', [])),
             'replies_sent': processed_count,
             'errors': errors
@@ -85,18 +138,73 @@ def lambda_handler(event, context):
         
         logger.info(f"Reply processing completed: {processed_count} sent, {len(errors)} errors")
         
-        return lambda_response(200, {
+        response = lambda_response(200, {
             'status': 'success',
             'replies_sent': processed_count,
-            'errors': len(errors)
+            'errors': len(errors),
+            'batchItemFailures': batch_item_failures
         })
+        # The SQS event source mapping reads batchItemFailures from the top level
+        response['batchItemFailures'] = batch_item_failures
+        return response
         
     except Exception as e:
         logger.error(f"Reply handler failed: {str(e)}")
-        return lambda_response(500, {'status': 'error', 'message': str(e)})
+        response = lambda_response(500, {'status': 'error', 'message': str(e)})
+        # Nothing is known to have been handled, so retry the whole batch
+        response['batchItemFailures'] = [
+            {'itemIdentifier': record['messageId']}
+            for record in event.get('Records', []) if 'messageId' in record
+        ]
+        return response
+    
+    finally:
+        # Write every audit entry from this invocation in one batch
+        if aws_service:
+            aws_service.flush_audit_logs()
+
+
+def handle_message(aws_service: AWSService, now_iso: str, meta_client: MetaAPIClient,
+                   message_body: dict) -> Tuple[bool, Optional[str]]:
+    """
+    Handle one SQS message
+    Returns (processed, error message or None)
+    """
+    
+    try:
+        # DEBUG: Log what we received
+        logger.info(f"Reply handler received message: {message_body}")
+        
+        if message_body.get('action') == 'reply':
+            comment_id = message_body['comment_id']
+            client_id = message_body['client_id']
+            classification = message_body.get('classification', {})
+            
+            logger.info(f"Processing reply for comment: {comment_id}")
+            
+            # Process the reply
+            success = process_reply(
+                aws_service,
+                now_iso,
+                meta_client,
+                comment_id,
+                client_id,
+                classification
+            )
+            
+            if not success:
+                return False, f"Failed to reply to comment {comment_id}"
+            return True, None
+        
+        return False, None
+        
+    except Exception as e:
+        error_msg = f"Error processing record: {str(e)}"
+        logger.error(error_msg)
+        return False, error_msg
 
 
-def process_reply(aws_service: AWSService, meta_client: MetaAPIClient,
+def process_reply(aws_service: AWSService, now_iso: str, meta_client: MetaAPIClient,
                  comment_id: str, client_id: str, classification: dict) -> bool:
     """
     Process a reply to a specific comment
@@ -128,18 +236,18 @@ def process_reply(aws_service: AWSService, meta_client: MetaAPIClient,
             aws_service.update_comment(comment_id, {
                 'reply_sent': True,
                 'reply_message': reply_message,
-                'reply_timestamp': datetime.now(timezone.utc).isoformat(),
+                'reply_timestamp': now_iso,
                 'action_taken': 'replied'
             })
             
             # Log successful reply
-            aws_service.save_audit_log('reply_sent', {
+            aws_service.record_audit('reply_sent', {
                 'comment_id': comment_id,
                 'client_id': client_id,
                 'reply_message': reply_message,
                 'classification': classification,
-                'timestamp': datetime.now(timezone.utc).isoformat()
-            })
+                'timestamp': now_iso
+            }, idempotency_key=comment_id)
             
             logger.info(f"Successfully replied to comment: {comment_id}")
             return True
@@ -150,7 +258,7 @@ def process_reply(aws_service: AWSService, meta_client: MetaAPIClient,
             aws_service.update_comment(comment_id, {
                 'reply_failed': True,
                 'reply_error': 'API call failed',
-                'reply_timestamp': datetime.now(timezone.utc).isoformat()
+                'reply_timestamp': now_iso
             })
             
             return False
@@ -162,7 +270,7 @@ def process_reply(aws_service: AWSService, meta_client: MetaAPIClient,
         aws_service.update_comment(comment_id, {
             'reply_failed': True,
             'reply_error': str(e),
-            'reply_timestamp': datetime.now(timezone.utc).isoformat()
+            'reply_timestamp': now_iso
         })
         
         return False
@@ -197,23 +305,14 @@ def get_reply_template(classification: dict, client_config: dict) -> str:
     
     templates = client_config.get('templates', {})
     
-    # Match by intent first
-    intent = classification.get('intent', 'general')
-    if intent in templates:
-        return templates[intent]
-    
-    # Match by sentiment
-    sentiment = classification.get('sentiment', 'neutral')
-    if sentiment in templates:
-        return templates[sentiment]
-    
-    # Match by urgency
-    urgency = classification.get('urgency', 'low')
-    if urgency in templates:
-        return templates[urgency]
+    # Match by intent first, then sentiment, then urgency; one lookup each
+    for field, fallback in TEMPLATE_MATCH_ORDER:
+        template = templates.get(classification.get(field, fallback))
+        if template is not None:
+            return template
     
     # Default template
-    return templates.get('default', "Thank you for your comment! We appreciate your feedback and will respond soon.")
+    return templates.get('default', DEFAULT_TEMPLATE)
 
 
 def personalize_template(template: str, comment: dict, classification: dict) -> str:
@@ -227,20 +326,15 @@ def personalize_template(template: str, comment: dict, classification: dict) ->
         
         # Define replacement variables
         replacements = {
-            '{name}': author_name,
-            '{first_name}': author_name,
-            '{time_of_day}': get_time_of_day_greeting(),
-            '{sentiment}': classification.get('sentiment', 'neutral'),
-            '{platform}': comment.get('platform', 'social media').title()
+            'name': author_name,
+            'first_name': author_name,
+            'time_of_day': get_time_of_day_greeting(),
+            'sentiment': classification.get('sentiment', 'neutral'),
+            'platform': comment.get('platform', 'social media').title()
         }
         
-        # Apply replacements
-        personalized = template
-        for placeholder, value in replacements.items():
-            personalized = personalized.replace(placeholder, value)
-        
-        # Clean up any remaining placeholders
-        personalized = re.sub(r'\{[^}]+\}', '', personalized)
+        # Apply replacements in one pass; unknown placeholders are removed
+        personalized = PLACEHOLDER_PATTERN.sub(lambda match: replacements.get(match.group(1), ''), template)
         
         return personalized.strip()
         
@@ -255,8 +349,6 @@ def get_time_of_day_greeting() -> str:
     """
     
     try:
-        from datetime import datetime
-        
         hour = datetime.now().hour
         
         if 5 <= hour < 12:
@@ -305,16 +397,12 @@ def add_appropriate_emoji(message: str) -> str:
     """
     
     try:
-        message_lower = message.lower()
-        
-        if any(word in message_lower for word in ['thank', 'appreciate', 'great']):
-            return message + " 😊"
-        elif any(word in message_lower for word in ['sorry', 'apologize', 'issue']):
-            return message + " 🙏"
-        elif any(word in message_lower for word in ['help', 'support', 'assist']):
-            return message + " 🤝"
-        else:
-            return message
+        # One scan for every keyword; the highest-priority group found wins
+        matches = [EMOJI_KEYWORDS[keyword.lower()] for keyword in EMOJI_PATTERN.findall(message)]
+        if matches:
+            return message + min(matches)[1]
+        
+        return message
             
     except Exception:
         return message
@@ -3,53 +3,191 @@ Shared utilities for ORM Platform Lambda functions
 Handles AWS services, API integrations, and common operations
 """
 
+import hashlib
 import json
 import boto3
+from boto3.dynamodb.conditions import Attr, ConditionBase
+from botocore.config import Config
 import logging
 import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from datetime import datetime, timezone
-from typing import Dict, Any, Optional, List
+from decimal import Decimal
+from typing import Dict, Any, Optional, List, Pattern, Tuple
 import uuid
 
+try:
+    import orjson
+except ImportError:  # Fall back to the stdlib json module
+    orjson = None
+
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
+# Shared botocore config: keep TLS connections alive between calls and size the
+# pool generously so concurrent callers never hit "Connection pool is full".
+# Short timeouts let a stalled connection fail over to a retry instead of
+# eating the Lambda's time budget (botocore defaults to 60s each)
+BOTO_CONFIG = Config(
+    tcp_keepalive=True,
+    max_pool_connections=50,
+    connect_timeout=1,
+    read_timeout=5,
+    retries={'mode': 'standard', 'max_attempts': 3}
+)
+
+# Parallel Graph API requests when paging through comments on Instagram media
+MEDIA_FETCH_WORKERS = 8
+
+# Static Graph API field expansions, built once instead of per request
+PAGE_COMMENT_FIELDS = '{id,message,created_time,from,like_count}'
+INSTAGRAM_COMMENT_FIELDS = 'id,text,timestamp,like_count,user{id,username},replies{id,text,timestamp,user{username}}'
+INSTAGRAM_MEDIA_FIELDS = f'id,caption,media_type,timestamp,permalink,comments.limit(100){{{INSTAGRAM_COMMENT_FIELDS}}}'
+
+# Persisted OpenAI classifications expire after a week (DynamoDB TTL on expires_at)
+CLASSIFICATION_CACHE_TTL_SECONDS = 7 * 24 * 60 * 60
+
+# DynamoDB BatchGetItem accepts at most 100 keys per request
+BATCH_GET_LIMIT = 100
+BATCH_MAX_ATTEMPTS = 5
+
+# Conditional comment puts run concurrently (BatchWriteItem has no conditions)
+SAVE_COMMENT_WORKERS = 10
+
+# Namespace for deterministic audit log_ids (see AWSService.record_audit)
+AUDIT_LOG_NAMESPACE = uuid.UUID('6f1c2d0e-5b7a-4c1e-9a43-2f8d9e0b7c15')
+
+# SQS SendMessageBatch accepts at most 10 entries per request
+SQS_BATCH_LIMIT = 10
+
+class TTLCache:
+    """Thread-safe in-memory LRU cache whose entries expire after ttl_seconds"""
+    
+    def __init__(self, maxsize: int = 1024, ttl_seconds: float = 300):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: Any, default: Any = None) -> Any:
+        """Return the cached value, or default if missing or expired"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            
+            self._data.move_to_end(key)
+            return value
+    
+    def set(self, key: Any, value: Any) -> None:
+        """Store a value, evicting the least recently used entry when full"""
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+    
+    def delete(self, key: Any) -> None:
+        """Remove an entry if present"""
+        with self._lock:
+            self._data.pop(key, None)
+    
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+# Client configs change rarely; cache them per container for a few minutes
+_CONFIG_CACHE = TTLCache(maxsize=256, ttl_seconds=300)
+
+# Comment IDs known to be stored; existence never reverts, so ingestion can skip
+# re-checking comments it already saw on a previous run in this container
+_KNOWN_COMMENT_IDS = TTLCache(maxsize=10000, ttl_seconds=3600)
+
+
 class AWSService:
     """Handles all AWS service interactions"""
     
     def __init__(self):
         # AWS Lambda automatically provides AWS_REGION, or we can detect it
         self.region = os.environ.get('AWS_REGION') or os.environ.get('AWS_DEFAULT_REGION', 'ap-south-1')
-        self.dynamodb = boto3.resource('dynamodb', region_name=self.region)
-        self.sqs = boto3.client('sqs', region_name=self.region)
-        self.secrets = boto3.client('secretsmanager', region_name=self.region)
+        self.dynamodb = boto3.resource('dynamodb', region_name=self.region, config=BOTO_CONFIG)
+        self.sqs = boto3.client('sqs', region_name=self.region, config=BOTO_CONFIG)
+        self.secrets = boto3.client('secretsmanager', region_name=self.region, config=BOTO_CONFIG)
         
         # Table names from environment variables
         self.comments_table = os.environ.get('COMMENTS_TABLE')
         self.config_table = os.environ.get('CONFIG_TABLE')
         self.audit_table = os.environ.get('AUDIT_TABLE')
+        self.classification_cache_table = os.environ.get('CLASSIFICATION_CACHE_TABLE')
         self.queue_url = os.environ.get('QUEUE_URL')
+        
+        # Audit entries buffered by record_audit until flush_audit_logs
+        self._audit_buffer = []
+        self._audit_lock = threading.Lock()
+        
+        # DynamoDB Table wrappers, built once per table name
+        self._tables = {}
+    
+    def get_table(self, table_name: str):
+        """Return the cached DynamoDB Table resource for table_name"""
+        table = self._tables.get(table_name)
+        if table is None:
+            table = self._tables[table_name] = self.dynamodb.Table(table_name)
+        return table
     
     def get_secrets(self) -> Dict[str, str]:
         """Retrieve API keys from Secrets Manager"""
         try:
             secret_name = os.environ.get('SECRET_NAME', 'orm-platform-api-keys-dev')
+            
+            # Prefer the Parameters and Secrets Lambda Extension's local cache when deployed
+            extension_port = os.environ.get('PARAMETERS_SECRETS_EXTENSION_HTTP_PORT')
+            if extension_port:
+                try:
+                    return self._get_secrets_from_extension(secret_name, extension_port)
+                except Exception as e:
+                    logger.warning(f"Secrets extension unavailable, using Secrets Manager: {e}")
+            
             response = self.secrets.get_secret_value(SecretId=secret_name)
-            return json.loads(response['SecretString'])
+            return json_loads(response['SecretString'])
         except Exception as e:
             logger.error(f"Failed to retrieve secrets: {e}")
             raise
     
+    def _get_secrets_from_extension(self, secret_name: str, port: str) -> Dict[str, str]:
+        """Read the secret from the extension's localhost endpoint (no SigV4, no API call when cached)"""
+        from urllib.parse import quote
+        from urllib.request import Request, urlopen
+        
+        request = Request(
+            f"http://localhost:{port}/secretsmanager/get?secretId={quote(secret_name, safe='')}",
+            headers={'X-Aws-Parameters-Secrets-Token': os.environ['AWS_SESSION_TOKEN']}
+        )
+        with urlopen(request, timeout=2) as response:
+            return json_loads(json_loads(response.read())['SecretString'])
+    
     def save_comment(self, comment_data: Dict[str, Any]) -> bool:
         """Save comment to DynamoDB"""
         try:
-            table = self.dynamodb.Table(self.comments_table)
+            table = self.get_table(self.comments_table)
             
             # Add metadata
+            now_iso = datetime.now(timezone.utc).isoformat()
             comment_data.update({
-                'created_at': datetime.now(timezone.utc).isoformat(),
-                'updated_at': datetime.now(timezone.utc).isoformat(),
+                'created_at': now_iso,
+                'updated_at': now_iso,
                 'status': 'pending'
             })
             
@@ -60,82 +198,317 @@ class AWSService:
             logger.error(f"Failed to save comment: {e}")
             return False
     
+    def save_comments_batch(self, comments: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        Save several new comments; a comment that is already stored is never overwritten
+        Returns (comments actually created, whether every write completed)
+        """
+        if not comments:
+            return [], True
+        
+        table = self.get_table(self.comments_table)
+        now_iso = datetime.now(timezone.utc).isoformat()
+        
+        def save_one(comment_data: Dict[str, Any]) -> Optional[bool]:
+            # True: created, False: already stored, None: write failed
+            comment_data.update({
+                'created_at': now_iso,
+                'updated_at': now_iso,
+                'status': 'pending'
+            })
+            try:
+                table.put_item(Item=comment_data, ConditionExpression='attribute_not_exists(comment_id)')
+                return True
+            except table.meta.client.exceptions.ConditionalCheckFailedException:
+                return False
+            except Exception as e:
+                logger.error(f"Failed to save comment {comment_data['comment_id']}: {e}")
+                return None
+        
+        with ThreadPoolExecutor(max_workers=min(SAVE_COMMENT_WORKERS, len(comments))) as executor:
+            results = list(executor.map(save_one, comments))
+        
+        saved = []
+        for comment_data, created in zip(comments, results):
+            if created is not None:
+                _KNOWN_COMMENT_IDS.set(comment_data['comment_id'], True)
+            if created:
+                saved.append(comment_data)
+        
+        logger.info(f"Saved {len(saved)} of {len(comments)} comments")
+        return saved, None not in results
+    
+    def get_existing_comment_ids(self, comment_ids: List[str]) -> set:
+        """Return which of the given comment_ids are already stored (BatchGetItem, keys only)"""
+        existing = set()
+        keys = []
+        for comment_id in dict.fromkeys(comment_ids):
+            if _KNOWN_COMMENT_IDS.get(comment_id):
+                existing.add(comment_id)
+            else:
+                keys.append({'comment_id': comment_id})
+        
+        # Only positive answers are cached; a failed lookup is simply retried next run
+        for item in self._batch_get_items(self.comments_table, keys, projection='comment_id'):
+            _KNOWN_COMMENT_IDS.set(item['comment_id'], True)
+            existing.add(item['comment_id'])
+        
+        return existing
+    
     def get_comment(self, comment_id: str) -> Optional[Dict[str, Any]]:
         """Retrieve comment from DynamoDB"""
         try:
-            table = self.dynamodb.Table(self.comments_table)
+            table = self.get_table(self.comments_table)
             response = table.get_item(Key={'comment_id': comment_id})
             return response.get('Item')
         except Exception as e:
             logger.error(f"Failed to get comment {comment_id}: {e}")
             return None
     
-    def update_comment(self, comment_id: str, updates: Dict[str, Any]) -> bool:
-        """Update comment in DynamoDB"""
+    def batch_get_comments(self, comment_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Retrieve several comments with BatchGetItem, keyed by comment_id"""
+        keys = [{'comment_id': comment_id} for comment_id in dict.fromkeys(comment_ids)]
+        items = self._batch_get_items(self.comments_table, keys)
+        return {item['comment_id']: item for item in items}
+    
+    def update_comment(self, comment_id: str, updates: Dict[str, Any],
+                       condition: Optional[ConditionBase] = None) -> bool:
+        """
+        Update comment in DynamoDB
+        condition (e.g. Attr('hidden').not_exists()) must also hold, or nothing is written
+        """
         try:
-            table = self.dynamodb.Table(self.comments_table)
+            table = self.get_table(self.comments_table)
             
-            # Build update expression with reserved keyword handling
-            update_expr = "SET updated_at = :updated_at"
+            # Build update expression with reserved keyword handling, joined once
+            assignments = ["updated_at = :updated_at"]
             expr_values = {':updated_at': datetime.now(timezone.utc).isoformat()}
             expr_names = {}
             
             for key, value in updates.items():
-                safe_key = f"#{key}"
-                update_expr += f", {safe_key} = :{key}"
+                assignments.append(f"#{key} = :{key}")
                 expr_values[f":{key}"] = value
-                expr_names[safe_key] = key
+                expr_names[f"#{key}"] = key
             
-            table.update_item(
-                Key={'comment_id': comment_id},
-                UpdateExpression=update_expr,
-                ExpressionAttributeValues=expr_values,
-                ExpressionAttributeNames=expr_names
-            )
+            # The condition stops updates from creating partial comments
+            condition_expression = Attr('comment_id').exists()
+            if condition is not None:
+                condition_expression = condition_expression & condition
+            
+            update_kwargs = {
+                'Key': {'comment_id': comment_id},
+                'UpdateExpression': "SET " + ", ".join(assignments),
+                'ConditionExpression': condition_expression,
+                'ExpressionAttributeValues': expr_values
+            }
+            # DynamoDB rejects an empty ExpressionAttributeNames map
+            if expr_names:
+                update_kwargs['ExpressionAttributeNames'] = expr_names
+            
+            # Single UpdateItem
+            table.update_item(**update_kwargs)
             
             logger.info(f"Updated comment {comment_id}")
             return True
+        except self.dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
+            logger.info(f"Skipped update of comment {comment_id}: condition not met")
+            return False
         except Exception as e:
             logger.error(f"Failed to update comment {comment_id}: {e}")
             return False
     
-    def get_client_config(self, client_id: str, config_type: str) -> Optional[Dict[str, Any]]:
-        """Get client configuration from DynamoDB"""
+    def get_client_config(self, client_id: str, config_type: str, use_cache: bool = True) -> Optional[Dict[str, Any]]:
+        """
+        Get client configuration from DynamoDB
+        Results are cached per container for a few minutes; callers must not mutate them
+        """
+        if use_cache:
+            cached = _CONFIG_CACHE.get((client_id, config_type))
+            if cached is not None:
+                return cached
+        
         try:
-            table = self.dynamodb.Table(self.config_table)
+            table = self.get_table(self.config_table)
             response = table.get_item(
                 Key={'client_id': client_id, 'config_type': config_type}
             )
-            return response.get('Item', {}).get('config', {})
+            config = response.get('Item', {}).get('config', {})
+            _CONFIG_CACHE.set((client_id, config_type), config)
+            return config
         except Exception as e:
             logger.error(f"Failed to get config for {client_id}: {e}")
             return {}
     
-    def save_audit_log(self, action_type: str, details: Dict[str, Any]) -> bool:
-        """Save audit log to DynamoDB"""
+    def batch_get_client_configs(self, client_ids: List[str], config_type: str) -> Dict[str, Dict[str, Any]]:
+        """Get one config type for several clients with BatchGetItem, keyed by client_id"""
+        configs = self.batch_get_client_config_types(client_ids, [config_type])
+        return {client_id: configs[(client_id, config_type)] for client_id in dict.fromkeys(client_ids)}
+    
+    def batch_get_client_config_types(self, client_ids: List[str],
+                                      config_types: List[str]) -> Dict[Tuple[str, str], Dict[str, Any]]:
+        """Get several config types for several clients in one BatchGetItem pass, keyed by (client_id, config_type)"""
+        configs = {}
+        missing_keys = []
+        
+        for client_id in dict.fromkeys(client_ids):
+            for config_type in config_types:
+                cached = _CONFIG_CACHE.get((client_id, config_type))
+                if cached is not None:
+                    configs[(client_id, config_type)] = cached
+                else:
+                    missing_keys.append((client_id, config_type))
+        
+        if missing_keys:
+            keys = [{'client_id': client_id, 'config_type': config_type} for client_id, config_type in missing_keys]
+            items, unanswered = self._batch_get_items_checked(self.config_table, keys)
+            fetched = {(item['client_id'], item['config_type']): item.get('config', {}) for item in items}
+            failed = {(key['client_id'], key['config_type']) for key in unanswered}
+            
+            for key in missing_keys:
+                configs[key] = fetched.get(key, {})
+                # Clients without a config are cached as {} so they are not refetched;
+                # keys that failed to load are not cached and are retried next time
+                if key not in failed:
+                    _CONFIG_CACHE.set(key, configs[key])
+        
+        return configs
+    
+    def get_cached_classifications(self, cache_keys: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Look up persisted OpenAI classifications by cache key; empty when no cache table is configured"""
+        if not self.classification_cache_table or not cache_keys:
+            return {}
+        
+        keys = [{'cache_key': cache_key} for cache_key in dict.fromkeys(cache_keys)]
+        items = self._batch_get_items(self.classification_cache_table, keys)
+        
+        # TTL deletion lags expiry, so expired items can still be returned
+        now = int(time.time())
+        return {item['cache_key']: item['classification'] for item in items if item.get('expires_at', 0) > now}
+    
+    def save_cached_classifications(self, classifications: Dict[str, Dict[str, Any]]) -> bool:
+        """Persist OpenAI classifications by cache key for CLASSIFICATION_CACHE_TTL_SECONDS"""
+        if not self.classification_cache_table or not classifications:
+            return True
+        
         try:
-            table = self.dynamodb.Table(self.audit_table)
+            table = self.get_table(self.classification_cache_table)
+            expires_at = int(time.time()) + CLASSIFICATION_CACHE_TTL_SECONDS
             
-            log_entry = {
-                'log_id': str(uuid.uuid4()),
-                'timestamp': datetime.now(timezone.utc).isoformat(),
-                'action_type': action_type,
-                'details': details
-            }
+            with table.batch_writer(overwrite_by_pkeys=['cache_key']) as batch:
+                for cache_key, classification in classifications.items():
+                    batch.put_item(Item={
+                        'cache_key': cache_key,
+                        'classification': classification,
+                        'expires_at': expires_at
+                    })
+            
+            return True
+        except Exception as e:
+            logger.error(f"Failed to save cached classifications: {e}")
+            return False
+    
+    def _batch_get_items(self, table_name: str, keys: List[Dict[str, Any]],
+                         projection: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Run BatchGetItem in chunks; keys that could not be read are logged and skipped"""
+        return self._batch_get_items_checked(table_name, keys, projection)[0]
+    
+    def _batch_get_items_checked(self, table_name: str, keys: List[Dict[str, Any]],
+                                 projection: Optional[str] = None) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        Run BatchGetItem in chunks, retrying UnprocessedKeys with exponential backoff
+        Returns (items, keys left unanswered by an error or persistent throttling);
+        any other requested key is known to be absent from the table
+        """
+        items = []
+        unanswered = []
+        
+        for start in range(0, len(keys), BATCH_GET_LIMIT):
+            request_items = {table_name: {'Keys': keys[start:start + BATCH_GET_LIMIT]}}
+            if projection:
+                request_items[table_name]['ProjectionExpression'] = projection
             
-            table.put_item(Item=log_entry)
+            try:
+                for attempt in range(BATCH_MAX_ATTEMPTS):
+                    response = self.dynamodb.batch_get_item(RequestItems=request_items)
+                    items.extend(response.get('Responses', {}).get(table_name, []))
+                    
+                    request_items = response.get('UnprocessedKeys')
+                    if not request_items:
+                        break
+                    time.sleep(min(0.05 * (2 ** attempt), 1.0))
+                else:
+                    logger.warning(f"Gave up on unprocessed keys for {table_name}")
+                    unanswered.extend(request_items[table_name]['Keys'])
+            except Exception as e:
+                logger.error(f"Failed to batch get items from {table_name}: {e}")
+                unanswered.extend(request_items[table_name]['Keys'])
+        
+        return items, unanswered
+    
+    def save_audit_log(self, action_type: str, details: Dict[str, Any]) -> bool:
+        """Save audit log to DynamoDB"""
+        try:
+            table = self.get_table(self.audit_table)
+            table.put_item(Item=self._build_audit_entry(action_type, details))
             logger.info(f"Saved audit log: {action_type}")
             return True
         except Exception as e:
             logger.error(f"Failed to save audit log: {e}")
             return False
     
+    def record_audit(self, action_type: str, details: Dict[str, Any], idempotency_key: Optional[str] = None) -> None:
+        """
+        Buffer an audit log entry; written by the next flush_audit_logs call
+        Entries with the same action_type and idempotency_key share a log_id, so
+        a redelivered SQS message overwrites its earlier entry instead of adding one
+        """
+        entry = self._build_audit_entry(action_type, details, idempotency_key)
+        with self._audit_lock:
+            self._audit_buffer.append(entry)
+    
+    def flush_audit_logs(self) -> bool:
+        """Write all buffered audit log entries with BatchWriteItem"""
+        with self._audit_lock:
+            entries, self._audit_buffer = self._audit_buffer, []
+        
+        if not entries:
+            return True
+        
+        try:
+            table = self.get_table(self.audit_table)
+            
+            # batch_writer sends 25 items per request and resends unprocessed items
+            with table.batch_writer(overwrite_by_pkeys=['log_id']) as batch:
+                for entry in entries:
+                    batch.put_item(Item=entry)
+            
+            logger.info(f"Saved {len(entries)} audit logs")
+            return True
+        except Exception as e:
+            logger.error(f"Failed to save audit logs: {e}")
+            return False
+    
+    def _build_audit_entry(self, action_type: str, details: Dict[str, Any],
+                           idempotency_key: Optional[str] = None) -> Dict[str, Any]:
+        if idempotency_key is None:
+            # Millisecond timestamp + 64 random bits: unique, shorter than a UUID and time-sortable
+            log_id = f"{time.time_ns() // 1_000_000:013x}{os.urandom(8).hex()}"
+        else:
+            log_id = str(uuid.uuid5(AUDIT_LOG_NAMESPACE, f"{action_type}|{idempotency_key}"))
+        
+        return {
+            'log_id': log_id,
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'action_type': action_type,
+            'details': details
+        }
+    
     def send_to_queue(self, message: Dict[str, Any], delay_seconds: int = 0) -> bool:
         """Send message to SQS queue"""
         try:
             response = self.sqs.send_message(
                 QueueUrl=self.queue_url,
-                MessageBody=json.dumps(message),
+                MessageBody=json_dumps(message),
                 DelaySeconds=delay_seconds
             )
             
@@ -144,42 +517,142 @@ class AWSService:
         except Exception as e:
             logger.error(f"Failed to send message to queue: {e}")
             return False
+    
+    def send_messages_batch(self, messages: List[Dict[str, Any]]) -> List[int]:
+        """
+        Send messages to the SQS queue with SendMessageBatch, 10 per request
+        Each entry is {'message': dict, 'delay_seconds': int}; returns the indexes that failed
+        """
+        failed = []
+        
+        for start in range(0, len(messages), SQS_BATCH_LIMIT):
+            pending = {
+                str(index): {
+                    'Id': str(index),
+                    'MessageBody': json_dumps(messages[index]['message']),
+                    'DelaySeconds': messages[index].get('delay_seconds', 0)
+                }
+                for index in range(start, min(start + SQS_BATCH_LIMIT, len(messages)))
+            }
+            
+            try:
+                for attempt in range(BATCH_MAX_ATTEMPTS):
+                    response = self.sqs.send_message_batch(
+                        QueueUrl=self.queue_url,
+                        Entries=list(pending.values())
+                    )
+                    
+                    retry = {}
+                    for failure in response.get('Failed', []):
+                        if failure.get('SenderFault'):
+                            logger.error(f"Rejected queue message {failure['Id']}: {failure.get('Message')}")
+                            failed.append(int(failure['Id']))
+                        else:
+                            retry[failure['Id']] = pending[failure['Id']]
+                    
+                    pending = retry
+                    if not pending:
+                        break
+                    time.sleep(min(0.05 * (2 ** attempt), 1.0))
+                else:
+                    logger.error(f"Gave up sending {len(pending)} queue messages")
+                    failed.extend(int(entry_id) for entry_id in pending)
+            except Exception as e:
+                logger.error(f"Failed to send message batch to queue: {e}")
+                failed.extend(int(entry_id) for entry_id in pending)
+        
+        logger.info(f"Sent {len(messages) - len(failed)} messages to queue")
+        return failed
 
 
 class MetaAPIClient:
     """Handles Meta Graph API interactions"""
     
     def __init__(self, access_token: str):
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+        
         self.access_token = access_token
         self.base_url = "https://graph.facebook.com/v23.0"
         self.headers = {"Authorization": f"Bearer {access_token}"}
+        
+        # One pooled keep-alive session so Graph API calls reuse TLS connections;
+        # Retry's default allowed_methods leaves POSTs (replies, hides) unretried
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        self.session.headers['Accept-Encoding'] = 'gzip'
+        self.session.mount("https://", HTTPAdapter(
+            pool_connections=20,
+            pool_maxsize=20,
+            max_retries=Retry(total=3, backoff_factor=0.2,
+                              status_forcelist=[429, 500, 502, 503, 504],
+                              raise_on_status=False)
+        ))
+        self.timeout = (3, 15)
     
     def get_page_posts(self, page_id: str, limit: int = 25) -> List[Dict[str, Any]]:
         """Get recent posts from a Facebook page"""
-        import requests
-        
         try:
             url = f"{self.base_url}/{page_id}/posts"
             params = {
-                'fields': 'id,message,created_time,comments.limit(100){id,message,created_time,from,like_count}',
+                'fields': f'id,message,created_time,comments.limit(100){PAGE_COMMENT_FIELDS}',
                 'limit': limit,
                 'access_token': self.access_token
             }
             
-            response = requests.get(url, params=params)
+            response = self.session.get(url, params=params, timeout=self.timeout)
             response.raise_for_status()
             
-            data = response.json()
+            data = json_loads(response.content)
             return data.get('data', [])
             
         except Exception as e:
             logger.error(f"Failed to get page posts: {e}")
             return []
     
+    def get_page_posts_with_comments(self, page_id: str, since_time: Optional[datetime] = None,
+                                     limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        Get recent page posts with their comments expanded in the same request.
+        When since_time is given the Graph API only returns comments created after it
+        """
+        try:
+            comments_edge = 'comments.limit(100)'
+            if since_time:
+                comments_edge = f'comments.since({int(since_time.timestamp())}).limit(100)'
+            
+            url = f"{self.base_url}/{page_id}/posts"
+            params = {
+                'fields': f'id,{comments_edge}{PAGE_COMMENT_FIELDS}',
+                'limit': limit,
+                'access_token': self.access_token
+            }
+            
+            response = self.session.get(url, params=params, timeout=self.timeout)
+            response.raise_for_status()
+            
+            posts = json_loads(response.content).get('data', [])
+            
+            # Follow the comments cursor for posts with more than one page of new comments
+            for post in posts:
+                comments = post.get('comments', {})
+                next_url = comments.get('paging', {}).get('next')
+                while next_url:
+                    page = self.session.get(next_url, timeout=self.timeout)
+                    page.raise_for_status()
+                    page_data = json_loads(page.content)
+                    comments.setdefault('data', []).extend(page_data.get('data', []))
+                    next_url = page_data.get('paging', {}).get('next')
+            
+            return posts
+            
+        except Exception as e:
+            logger.error(f"Failed to get page posts with comments: {e}")
+            return []
+    
     def get_ad_comments(self, ad_account_id: str) -> List[Dict[str, Any]]:
         """Get comments from ad campaigns"""
-        import requests
-        
         try:
             # Get ad campaigns first
             url = f"{self.base_url}/act_{ad_account_id}/campaigns"
@@ -188,10 +661,10 @@ class MetaAPIClient:
                 'access_token': self.access_token
             }
             
-            response = requests.get(url, params=params)
+            response = self.session.get(url, params=params, timeout=self.timeout)
             response.raise_for_status()
             
-            campaigns = response.json().get('data', [])
+            campaigns = json_loads(response.content).get('data', [])
             all_comments = []
             
             # Get comments for each campaign
@@ -207,8 +680,6 @@ class MetaAPIClient:
     
     def _get_campaign_comments(self, campaign_id: str) -> List[Dict[str, Any]]:
         """Get comments for a specific campaign"""
-        import requests
-        
         try:
             # This is a simplified version - actual implementation depends on your ad structure
             url = f"{self.base_url}/{campaign_id}/insights"
@@ -217,7 +688,7 @@ class MetaAPIClient:
                 'access_token': self.access_token
             }
             
-            response = requests.get(url, params=params)
+            response = self.session.get(url, params=params, timeout=self.timeout)
             response.raise_for_status()
             
             # For MVP, return mock data structure
@@ -230,8 +701,6 @@ class MetaAPIClient:
     
     def reply_to_comment(self, comment_id: str, message: str) -> bool:
         """Reply to a comment"""
-        import requests
-        
         try:
             url = f"{self.base_url}/{comment_id}/replies"
             params = {
@@ -239,7 +708,7 @@ class MetaAPIClient:
                 'access_token': self.access_token
             }
             
-            response = requests.post(url, params=params)
+            response = self.session.post(url, params=params, timeout=self.timeout)
             response.raise_for_status()
             
             logger.info(f"Replied to comment {comment_id}")
@@ -251,8 +720,6 @@ class MetaAPIClient:
     
     def hide_comment(self, comment_id: str) -> bool:
         """Hide a comment from public view"""
-        import requests
-        
         try:
             url = f"{self.base_url}/{comment_id}"
             data = {
@@ -260,7 +727,7 @@ class MetaAPIClient:
                 'access_token': self.access_token
             }
             
-            response = requests.post(url, data=data)
+            response = self.session.post(url, data=data, timeout=self.timeout)
             response.raise_for_status()
             
             logger.info(f"Hidden comment {comment_id}")
@@ -273,82 +740,45 @@ class MetaAPIClient:
     def get_instagram_media_comments(self, instagram_account_id: str, since_time=None) -> List[Dict[str, Any]]:
         """
         Auto-detect all new comments across all Instagram media posts
-        Uses proper Media → Comments edge pattern
+        Comments are expanded inline on the media request; only media with more
+        than one page of comments need follow-up requests
         """
-        import requests
-        from datetime import datetime, timezone, timedelta
-        
         try:
-            all_comments = []
+            since_key = utc_sort_key(since_time) if since_time else None
             
-            # Step 1: Get all media from Instagram account
+            # Step 1: Get all media from Instagram account with their comments
             media_url = f"{self.base_url}/{instagram_account_id}/media"
             media_params = {
-                'fields': 'id,caption,media_type,timestamp,permalink',
+                'fields': INSTAGRAM_MEDIA_FIELDS,
                 'limit': 50,  # Get recent 50 posts
                 'access_token': self.access_token
             }
             
             logger.info(f"Fetching Instagram media for account {instagram_account_id}")
-            media_response = requests.get(media_url, params=media_params)
+            media_response = self.session.get(media_url, params=media_params, timeout=self.timeout)
             media_response.raise_for_status()
             
-            media_list = media_response.json().get('data', [])
+            media_list = json_loads(media_response.content).get('data', [])
             logger.info(f"Found {len(media_list)} Instagram media posts")
             
-            # Step 2: For each media, get its comments using the edge
+            # Step 2: Filter the inline comments of each media
+            all_comments = []
+            overflow = []
             for media in media_list:
-                media_id = media.get('id')
-                media_timestamp = media.get('timestamp')
-                
-                # Get comments for this specific media
-                comments_url = f"{self.base_url}/{media_id}/comments"
-                comments_params = {
-                    'fields': 'id,text,timestamp,like_count,user{id,username},replies{id,text,timestamp,user{username}}',
-                    'limit': 100,  # Get up to 100 comments per post
-                    'access_token': self.access_token
-                }
-                
-                try:
-                    comments_response = requests.get(comments_url, params=comments_params)
-                    comments_response.raise_for_status()
-                    
-                    media_comments = comments_response.json().get('data', [])
-                    
-                    # Filter for new comments since last ingestion
-                    for comment in media_comments:
-                        comment_time = comment.get('timestamp')
-                        
-                        # Skip old comments if since_time is specified
-                        if since_time and comment_time:
-                            fixed_time = comment_time.replace('Z', '+00:00').replace('+0000', '+00:00')
-                            comment_dt = datetime.fromisoformat(fixed_time)
-                            if comment_dt <= since_time:
-                                continue
-                        
-                        # Standardize comment format for ORM processing
-                        standardized_comment = {
-                            'comment_id': comment.get('id'),
-                            'platform': 'instagram',
-                            'media_id': media_id,
-                            'media_type': media.get('media_type'),
-                            'media_permalink': media.get('permalink'),
-                            'text': comment.get('text', ''),
-                            'author_id': comment.get('user', {}).get('id', ''),
-                            'author_username': comment.get('user', {}).get('username', ''),
-                            'created_time': comment.get('timestamp', ''),
-                            'like_count': comment.get('like_count', 0),
-                            'has_replies': len(comment.get('replies', {}).get('data', [])) > 0,
-                            'raw_data': comment
-                        }
-                        
-                        all_comments.append(standardized_comment)
-                        
-                    logger.info(f"Media {media_id}: Found {len(media_comments)} comments")
-                    
-                except Exception as e:
-                    logger.warning(f"Failed to get comments for media {media_id}: {e}")
-                    continue
+                comments = media.get('comments', {})
+                all_comments.extend(self._standardize_media_comments(media, comments.get('data', []), since_key))
+                if comments.get('paging', {}).get('next'):
+                    overflow.append(media)
+            
+            # Step 3: Follow the comments cursor where there are more pages; the
+            # requests are independent, so they share the session's pool
+            if overflow:
+                with ThreadPoolExecutor(max_workers=min(MEDIA_FETCH_WORKERS, len(overflow))) as executor:
+                    for media_comments in executor.map(
+                        lambda media: self._get_more_media_comments(media, since_key),
+                        overflow
+                    ):
+                        all_comments.extend(media_comments)
             
             logger.info(f"Total new Instagram comments found: {len(all_comments)}")
             return all_comments
@@ -356,23 +786,79 @@ class MetaAPIClient:
         except Exception as e:
             logger.error(f"Failed to fetch Instagram media comments: {e}")
             return []
+    
+    def _get_more_media_comments(self, media: Dict[str, Any], since_key: Optional[str]) -> List[Dict[str, Any]]:
+        """Get the comments on one Instagram media beyond the first inline page"""
+        new_comments = []
+        next_url = media['comments']['paging']['next']
+        
+        try:
+            while next_url:
+                comments_response = self.session.get(next_url, timeout=self.timeout)
+                comments_response.raise_for_status()
+                
+                page = json_loads(comments_response.content)
+                new_comments.extend(self._standardize_media_comments(media, page.get('data', []), since_key))
+                next_url = page.get('paging', {}).get('next')
+            
+        except Exception as e:
+            logger.warning(f"Failed to get more comments for media {media.get('id')}: {e}")
+        
+        return new_comments
+    
+    def _standardize_media_comments(self, media: Dict[str, Any], media_comments: List[Dict[str, Any]],
+                                    since_key: Optional[str]) -> List[Dict[str, Any]]:
+        """Standardize the comments on one Instagram media created after since_key"""
+        new_comments = []
+        
+        # Filter for new comments since last ingestion
+        for comment in media_comments:
+            comment_time = comment.get('timestamp')
+            
+            # Skip old comments if since_time is specified
+            if since_key and comment_time and comment_time[:19] <= since_key:
+                continue
+            
+            # Standardize comment format for ORM processing
+            new_comments.append({
+                'comment_id': comment.get('id'),
+                'platform': 'instagram',
+                'media_id': media.get('id'),
+                'media_type': media.get('media_type'),
+                'media_permalink': media.get('permalink'),
+                'text': comment.get('text', ''),
+                'author_id': comment.get('user', {}).get('id', ''),
+                'author_username': comment.get('user', {}).get('username', ''),
+                'created_time': comment.get('timestamp', ''),
+                'like_count': comment.get('like_count', 0),
+                'has_replies': len(comment.get('replies', {}).get('data', [])) > 0
+            })
+        
+        return new_comments
 
 
 class OpenAIClient:
     """Handles OpenAI API interactions for classification"""
     
     def __init__(self, api_key: str):
+        import requests
+        from requests.adapters import HTTPAdapter
+        
         self.api_key = api_key
         self.base_url = "https://api.openai.com/v1"
         self.headers = {
             "Authorization": f"Bearer {api_key}",
             "Content-Type": "application/json"
         }
+        
+        # One pooled keep-alive session so concurrent classifications reuse TLS connections
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=20))
+        self.timeout = (5, 30)
     
     def classify_comment(self, comment_text: str, business_context: str = "") -> Dict[str, Any]:
         """Classify a comment using OpenAI"""
-        import requests
-        
         try:
             prompt = self._build_classification_prompt(comment_text, business_context)
             
@@ -383,17 +869,18 @@ class OpenAIClient:
                     {"role": "user", "content": prompt}
                 ],
                 "max_tokens": 150,
-                "temperature": 0.1
+                "temperature": 0.1,
+                "response_format": {"type": "json_object"}
             }
             
-            response = requests.post(
+            response = self.session.post(
                 f"{self.base_url}/chat/completions",
-                headers=self.headers,
-                json=data
+                json=data,
+                timeout=self.timeout
             )
             response.raise_for_status()
             
-            result = response.json()
+            result = json_loads(response.content)
             classification_text = result['choices'][0]['message']['content']
             
             return self._parse_classification(classification_text)
@@ -402,6 +889,53 @@ class OpenAIClient:
             logger.error(f"Failed to classify comment: {e}")
             return self._default_classification()
     
+    def classify_comments_batch(self, comment_texts: List[str], business_context: str = "") -> List[Dict[str, Any]]:
+        """Classify several comments that share a business context in one OpenAI request"""
+        try:
+            prompt = self._build_batch_classification_prompt(comment_texts, business_context)
+            
+            data = {
+                "model": "gpt-4o-mini",
+                "messages": [
+                    {"role": "system", "content": "You are an expert content moderator for social media comments."},
+                    {"role": "user", "content": prompt}
+                ],
+                "max_tokens": 150 * len(comment_texts),
+                "temperature": 0.1,
+                "response_format": {"type": "json_object"}
+            }
+            
+            response = self.session.post(
+                f"{self.base_url}/chat/completions",
+                json=data,
+                timeout=self.timeout
+            )
+            response.raise_for_status()
+            
+        except Exception as e:
+            logger.error(f"Failed to classify comment batch: {e}")
+            return [self._default_classification() for _ in comment_texts]
+        
+        # The request succeeded, so malformed or incomplete output is retried per
+        # comment rather than defaulted
+        try:
+            result = json_loads(response.content)
+            classifications = json_loads(result['choices'][0]['message']['content']).get('classifications', {})
+        except Exception as e:
+            logger.warning(f"Malformed batch classification output, classifying individually: {e}")
+            classifications = {}
+        
+        parsed = []
+        for index, comment_text in enumerate(comment_texts, start=1):
+            classification = classifications.get(str(index))
+            if isinstance(classification, dict):
+                parsed.append(self._normalize_classification(classification))
+            else:
+                logger.warning(f"Missing classification for batch item {index}")
+                parsed.append(self.classify_comment(comment_text, business_context))
+        
+        return parsed
+    
     def _build_classification_prompt(self, comment_text: str, business_context: str) -> str:
         """Build the classification prompt"""
         return f"""
@@ -421,6 +955,44 @@ Please provide a JSON response with these exact fields:
     "confidence": 0-100
 }}
 
+Consider:
+- Positive sentiment: compliments, satisfaction, recommendations
+- Negative sentiment: complaints, dissatisfaction, criticism
+- High urgency: legal threats, severe complaints, viral negative content
+- Medium urgency: legitimate complaints, specific issues
+- Low urgency: general questions, positive feedback
+- Toxicity score: 7+ should be hidden, 5-6 monitored, <5 normal
+"""
+    
+    def _build_batch_classification_prompt(self, comment_texts: List[str], business_context: str) -> str:
+        """Build the classification prompt for a numbered batch of comments"""
+        comments = "\n".join(
+            f"{index}. {json.dumps(text)}" for index, text in enumerate(comment_texts, start=1)
+        )
+        
+        return f"""
+Analyze each of these numbered social media comments and classify it according to the following criteria:
+
+Comments:
+{comments}
+
+Business Context: {business_context or "General business"}
+
+Please provide a JSON object mapping each comment number to its classification:
+{{
+    "classifications": {{
+        "1": {{
+            "sentiment": "positive|neutral|negative",
+            "urgency": "low|medium|high",
+            "intent": "question|complaint|compliment|spam|general",
+            "toxicity_score": 0-10,
+            "requires_response": true/false,
+            "suggested_action": "reply|hide|escalate|ignore",
+            "confidence": 0-100
+        }}
+    }}
+}}
+
 Consider:
 - Positive sentiment: compliments, satisfaction, recommendations
 - Negative sentiment: complaints, dissatisfaction, criticism
@@ -433,23 +1005,11 @@ Consider:
     def _parse_classification(self, classification_text: str) -> Dict[str, Any]:
         """Parse OpenAI response into structured data"""
         try:
-            # Try to extract JSON from the response
-            import re
-            json_match = re.search(r'\{.*\}', classification_text, re.DOTALL)
+            # response_format=json_object guarantees the content is a JSON object
+            classification = json_loads(classification_text)
             
-            if json_match:
-                classification = json.loads(json_match.group())
-                
-                # Validate and clean the classification
-                return {
-                    'sentiment': classification.get('sentiment', 'neutral'),
-                    'urgency': classification.get('urgency', 'low'),
-                    'intent': classification.get('intent', 'general'),
-                    'toxicity_score': int(classification.get('toxicity_score', 0)),
-                    'requires_response': bool(classification.get('requires_response', False)),
-                    'suggested_action': classification.get('suggested_action', 'ignore'),
-                    'confidence': int(classification.get('confidence', 50))
-                }
+            if isinstance(classification, dict):
+                return self._normalize_classification(classification)
             else:
                 logger.warning("Could not parse JSON from OpenAI response")
                 return self._default_classification()
@@ -458,6 +1018,22 @@ Consider:
             logger.error(f"Failed to parse classification: {e}")
             return self._default_classification()
     
+    def _normalize_classification(self, classification: Dict[str, Any]) -> Dict[str, Any]:
+        """Validate and clean a classification returned by OpenAI"""
+        try:
+            return {
+                'sentiment': classification.get('sentiment', 'neutral'),
+                'urgency': classification.get('urgency', 'low'),
+                'intent': classification.get('intent', 'general'),
+                'toxicity_score': int(classification.get('toxicity_score', 0)),
+                'requires_response': bool(classification.get('requires_response', False)),
+                'suggested_action': classification.get('suggested_action', 'ignore'),
+                'confidence': int(classification.get('confidence', 50))
+            }
+        except Exception as e:
+            logger.error(f"Failed to normalize classification: {e}")
+            return self._default_classification()
+    
     def _default_classification(self) -> Dict[str, Any]:
         """Return default classification when parsing fails"""
         return {
@@ -471,6 +1047,70 @@ Consider:
         }
 
 
+@lru_cache(maxsize=1024)
+def compile_keyword_pattern(keywords: Tuple[str, ...]) -> Optional[Pattern]:
+    """
+    Compile a keyword list into one case-insensitive alternation regex so a single
+    scan finds any keyword as a substring. Returns None for an empty list.
+    """
+    if not keywords:
+        return None
+    
+    alternatives = sorted({keyword.lower() for keyword in keywords}, key=len, reverse=True)
+    return re.compile('|'.join(re.escape(keyword) for keyword in alternatives))
+
+
+def _json_default(obj: Any) -> Any:
+    """Encode values DynamoDB returns that JSON does not support natively"""
+    if isinstance(obj, Decimal):
+        return int(obj) if obj == obj.to_integral_value() else float(obj)
+    if isinstance(obj, set):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def json_dumps(obj: Any) -> str:
+    """Serialize to a JSON string, using orjson when it is installed"""
+    if orjson:
+        return orjson.dumps(obj, default=_json_default, option=orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(obj, default=_json_default)
+
+
+def json_loads(data: Any) -> Any:
+    """Parse a JSON string or bytes, using orjson when it is installed"""
+    if orjson:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def audit_digest(value: Any) -> str:
+    """Short stable hash of a JSON-serializable value, for audit entries that reference it"""
+    payload = json.dumps(value, sort_keys=True, default=_json_default)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def utc_sort_key(dt: datetime) -> str:
+    """
+    Second-resolution UTC timestamp that compares lexicographically against the
+    first 19 characters of Meta's ISO-8601 timestamps (always +0000)
+    """
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc)
+    return dt.strftime('%Y-%m-%dT%H:%M:%S')
+
+
+def summarize_classification(classification: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Compact classification for audit logs; the full classification stays on the
+    comment item (joined by comment_id)
+    """
+    return {
+        'classification_sha': audit_digest(classification),
+        'toxicity_score': classification.get('toxicity_score'),
+        'intent': classification.get('intent')
+    }
+
+
 def lambda_response(status_code: int, body: Dict[str, Any], headers: Dict[str, str] = None) -> Dict[str, Any]:
     """Standard Lambda response format"""
     return {
@@ -481,7 +1121,7 @@ def lambda_response(status_code: int, body: Dict[str, Any], headers: Dict[str, s
             'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
             'Access-Control-Allow-Headers': 'Content-Type,Authorization'
         },
-        'body': json.dumps(body)
+        'body': json_dumps(body)
     }
 
 